@@ -7,7 +7,7 @@ from langchain.schema import HumanMessage, SystemMessage
 
 from tools.tools import get_flights, get_airport, get_passenger_booking, get_crew_assignment, get_disruption
 from tools.generate_bomb_threat_query import generate_bomb_threat_query
-from tools.send_email import send_email
+from tools.send_email import send_email_async
 from database import get_pool
 
 load_dotenv()
@@ -73,7 +73,7 @@ Regards,
 Airline Operations
 """
 
-        if send_email(p_email, subject, body):
+        if await send_email_async(p_email, subject, body):
             print(f" -> Sent to {p_email}")
             status = "sent"
         else:
@@ -7,23 +7,24 @@ import openai
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from agents.routing_rules import ROUTING_RULES
+from agents import routing_classifier
+
 client = OpenAI()
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# events routed in one LLM request: input budget (estimated tokens) and the
+# completion tokens reserved per event
+ROUTING_BATCH_TOKENS = int(os.getenv("ROUTING_BATCH_TOKENS", 3000))
+ROUTING_TOKENS_PER_EVENT = int(os.getenv("ROUTING_TOKENS_PER_EVENT", 80))
+# how long the upload path waits for more events before sending a batch
+ROUTING_BATCH_LINGER = float(os.getenv("ROUTING_BATCH_LINGER", 0.3))
 
-# ---- STRICT SYSTEM PROMPT (PUT THIS IN YOUR FILE) ----
-SYSTEM_PROMPT = """
-You are an aviation IRROPS Decision Engine.
-
-Your ONLY job:
-1. Read the incoming EVENT (already pre-cleaned text from PDF).
-2. Decide which operational agents must be triggered.
-3. Output STRICT JSON only. No explanations. No commentary.
 
-------------------------------------
-### EVENT CATEGORIES
+# agent descriptions shared by the single-event and the batch prompt
+_EVENT_CATEGORIES = """### EVENT CATEGORIES
 - weather_agent → weather disruptions, wind, fog, storms, crosswinds, METAR/SIGMET issues.
 - crew_agent → crew legality, hours, flight duty time, rest issues, crew shortage.
 - traffic_agent → runway closure, taxiway congestion, ATC flow programs, airport capacity.
@@ -31,7 +32,22 @@ Your ONLY job:
 - bomb_threat_agent → bomb threats, security incidents, terminal evacuations, security alerts.
 - monitoring_agent → everything else / low severity / not enough info.
 
+"""
+
+# ---- STRICT SYSTEM PROMPT (PUT THIS IN YOUR FILE) ----
+SYSTEM_PROMPT = (
+    """
+You are an aviation IRROPS Decision Engine.
+
+Your ONLY job:
+1. Read the incoming EVENT (already pre-cleaned text from PDF).
+2. Decide which operational agents must be triggered.
+3. Output STRICT JSON only. No explanations. No commentary.
+
 ------------------------------------
+"""
+    + _EVENT_CATEGORIES
+    + """------------------------------------
 ### RULES
 1. Output JSON in this exact schema:
 {
@@ -51,22 +67,94 @@ So be precise and avoid guessing unrelated agents.
 
 ------------------------------------
 """
+)
 
+# several events per request: one answer object keyed by event id
+BATCH_SYSTEM_PROMPT = (
+    """
+You are an aviation IRROPS Decision Engine.
+
+Your ONLY job:
+1. Read each incoming EVENT (already pre-cleaned text from PDF); every event has an "id".
+2. Decide, for each event independently, which operational agents must be triggered.
+3. Output STRICT JSON only. No explanations. No commentary.
+
+------------------------------------
+"""
+    + _EVENT_CATEGORIES
+    + """------------------------------------
+### RULES
+1. Output ONE JSON object with one entry per event id, in this exact schema:
+{
+  "<event id>": {"selected_agents": ["agent_name1", "agent_name2"], "reason": "short explanation"}
+}
+2. Every event id MUST appear. ALWAYS give each event an array of agents.
+3. NEVER output text outside JSON.
+4. If uncertain about an event, include "monitoring_agent" for it.
+5. If an event contains multiple signals, include multiple agents for it.
+6. The JSON MUST be valid and parseable.
+
+------------------------------------
+"""
+)
 
-def _call_openai_sync(prompt: str, max_tokens: int = 200):
+
+def _call_openai_sync(prompt: str, max_tokens: int = 200, system: str = SYSTEM_PROMPT):
     resp = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "system", "content": system},
             {"role": "user", "content": prompt},
         ],
         temperature=0,
         max_tokens=max_tokens,
+        # both prompts ask for a single JSON object
+        response_format={"type": "json_object"},
     )
     return resp.choices[0].message.content.strip()
 
 
+def _load_json(raw: str):
+    # tolerate a ```json fence around the answer
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("\n", 1)[1] if "\n" in raw else ""
+        raw = raw.rsplit("```", 1)[0]
+    return json.loads(raw)
+
+
+def _enforce_rules(event: dict, result: dict) -> dict:
+    # ✅ Crew agent enforcement
+    if "crew" in json.dumps(event).lower():
+        result["selected_agents"] = list(
+            set(result.get("selected_agents", []) + ["crew_agent"])
+        )
+    return result
+
+
+def _lookup_rules(event: dict):
+    """
+    Local routing: rule table and memo, then the trained classifier when it
+    is confident. None means the event needs the LLM.
+    """
+    result = ROUTING_RULES.lookup(event)
+    if result is None and routing_classifier.ROUTING_CLASSIFIER is not None:
+        result = routing_classifier.ROUTING_CLASSIFIER.decide(event)
+    return _enforce_rules(event, result) if result is not None else None
+
+
 async def ai_decide_agent(event: dict, db_rules: list = None) -> dict:
+    """
+    Routing rules, memoized decisions and the classifier first; the LLM only
+    when none of them applies.
+    """
+    result = _lookup_rules(event)
+    if result is not None:
+        return result
+    return await _llm_decide_agent(event, db_rules)
+
+
+async def _llm_decide_agent(event: dict, db_rules: list = None) -> dict:
     prompt = (
         "EVENT:\n"
         + json.dumps(event, indent=2)
@@ -81,14 +169,8 @@ async def ai_decide_agent(event: dict, db_rules: list = None) -> dict:
         raw = await loop.run_in_executor(exe, _call_openai_sync, prompt)
 
     try:
-        result = json.loads(raw)
-
-        # ✅ Crew agent enforcement
-        if "crew" in json.dumps(event).lower():
-            result["selected_agents"] = list(
-                set(result.get("selected_agents", []) + ["crew_agent"])
-            )
-
+        result = _enforce_rules(event, _load_json(raw))
+        ROUTING_RULES.remember(event, result)
         return result
 
     except Exception:
@@ -96,3 +178,143 @@ async def ai_decide_agent(event: dict, db_rules: list = None) -> dict:
             "selected_agents": ["monitoring_agent"],
             "reason": "fallback - invalid JSON from model",
         }
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _split_batches(events: list) -> list:
+    """
+    Group events into batches whose prompt fits ROUTING_BATCH_TOKENS.
+    """
+    batches, cur, cur_tokens = [], [], 0
+    for i, event in enumerate(events):
+        n = _estimate_tokens(json.dumps(event))
+        if cur and cur_tokens + n > ROUTING_BATCH_TOKENS:
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+async def _decide_batch(events: list, db_rules: list = None) -> dict:
+    """
+    One LLM request for several events; returns {event index: result} for the
+    events the model answered validly.
+    """
+    items = [{"id": str(i), "event": ev} for i, ev in enumerate(events)]
+    prompt = (
+        "EVENTS (route each one independently):\n"
+        + json.dumps(items, indent=2)
+        + "\n\nDB_RULES:\n"
+        + json.dumps(db_rules or [], indent=2)
+        + "\n\nRespond ONLY with one JSON object mapping every event id to "
+        + '{"selected_agents": [...], "reason": "..."}, e.g. '
+        + '{"0": {"selected_agents": ["weather_agent"], "reason": "fog"}}.'
+    )
+    max_tokens = ROUTING_TOKENS_PER_EVENT * len(events) + 50
+
+    loop = asyncio.get_event_loop()
+
+    with ThreadPoolExecutor(max_workers=1) as exe:
+        raw = await loop.run_in_executor(
+            exe, _call_openai_sync, prompt, max_tokens, BATCH_SYSTEM_PROMPT
+        )
+
+    try:
+        answer = _load_json(raw)
+    except Exception:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+
+    results = {}
+    for i, event in enumerate(events):
+        res = answer.get(str(i))
+        if isinstance(res, dict) and isinstance(res.get("selected_agents"), list):
+            results[i] = _enforce_rules(event, res)
+            ROUTING_RULES.remember(event, results[i])
+    return results
+
+
+async def _llm_decide_batch(events: list, db_rules: list = None) -> list:
+    """
+    LLM routing for several events; events missing from a batch answer fall
+    back to one request each.
+    """
+    if len(events) == 1:
+        return [await _llm_decide_agent(events[0], db_rules)]
+
+    batches = _split_batches(events)
+    answers = await asyncio.gather(
+        *[_decide_batch([events[i] for i in batch], db_rules) for batch in batches]
+    )
+
+    results = [None] * len(events)
+    for batch, answer in zip(batches, answers):
+        for pos, i in enumerate(batch):
+            results[i] = answer.get(pos)
+
+    missing = [i for i, res in enumerate(results) if res is None]
+    if missing:
+        print(f"[routing_ai] batch answer missing {len(missing)} events, routing singly")
+        singles = await asyncio.gather(
+            *[_llm_decide_agent(events[i], db_rules) for i in missing]
+        )
+        for i, res in zip(missing, singles):
+            results[i] = res
+    return results
+
+
+class RoutingBatcher:
+    """
+    Collects events that arrive within ROUTING_BATCH_LINGER seconds of each
+    other and routes them with one LLM request. Events that can be routed
+    locally return immediately. decide() has the same contract
+    as ai_decide_agent.
+    """
+
+    def __init__(self, db_rules: list = None, linger: float = ROUTING_BATCH_LINGER):
+        self.db_rules = db_rules
+        self.linger = linger
+        self._pending = []  # (event, future)
+        self._timer = None
+        self._tasks = set()  # in-flight batches
+
+    async def decide(self, event: dict) -> dict:
+        result = _lookup_rules(event)
+        if result is not None:
+            return result
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((event, fut))
+        if self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await fut
+
+    def _flush(self):
+        self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            # keep a reference until done so the task is not garbage-collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await _llm_decide_batch(
+                [event for event, _ in batch], self.db_rules
+            )
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res)
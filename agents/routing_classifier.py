@@ -0,0 +1,253 @@
+# agents/routing_classifier.py
+"""
+Multi-label routing classifier (TF-IDF + one-vs-rest logistic regression)
+trained offline on master_decision_table:
+
+    python -m agents.routing_classifier --out routing_model.json
+
+Training needs scikit-learn. The model is exported as plain JSON (vocabulary,
+idf and per-label weights) and scored here in pure Python, so serving has
+no extra dependency and takes tens of microseconds per event.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+
+from agents.routing_rules import event_signature
+from database import fetch_decision_history
+
+ROUTING_MODEL_PATH = os.getenv("ROUTING_MODEL_PATH", "routing_model.json")
+# minimum per-label certainty (max(p, 1 - p) of the least certain label)
+# before a prediction is used instead of the LLM
+ROUTING_CLASSIFIER_THRESHOLD = float(os.getenv("ROUTING_CLASSIFIER_THRESHOLD", 0.9))
+
+# always added downstream, so not worth predicting
+_IMPLIED_AGENTS = {"monitoring", "monitoring_agent"}
+# decisions not made by the LLM are left out of training
+_SKIP_REASONS = ("classifier", "fallback", "rule ")
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+
+def event_document(event: dict) -> str:
+    """
+    Text the classifier sees: type/severity markers plus the description.
+    """
+    types, severities, text = event_signature(event)
+    markers = [f"type_{t.replace(' ', '_')}" for t in types]
+    markers += [f"sev_{s.replace(' ', '_')}" for s in severities]
+    return " ".join(markers + [text])
+
+
+def _ngrams(doc: str, ngram_range: tuple) -> list:
+    # same analysis as sklearn's default word analyzer
+    tokens = _TOKEN_RE.findall(doc.lower())
+    lo, hi = ngram_range
+    grams = []
+    for n in range(lo, hi + 1):
+        grams.extend(" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1))
+    return grams
+
+
+class RoutingClassifier:
+    def __init__(self, model: dict):
+        self.labels = model["labels"]
+        self.always = model.get("always", [])
+        self.intercepts = model["intercepts"]
+        self.ngram_range = tuple(model["ngram_range"])
+        self.sublinear_tf = model["sublinear_tf"]
+        # term -> (idf, [weight per label])
+        self.terms = {t: (v[0], v[1]) for t, v in model["terms"].items()}
+        self.trained_at = model.get("trained_at")
+        self.predictions = 0
+        self.confident = 0
+        self.latency_total = 0.0
+
+    @classmethod
+    def load(cls, path: str = ROUTING_MODEL_PATH):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def predict(self, event: dict) -> tuple:
+        """
+        Return (agents, confidence) for one event.
+        """
+        t0 = time.perf_counter()
+        result = self.predict_document(event_document(event))
+        self.predictions += 1
+        self.latency_total += time.perf_counter() - t0
+        return result
+
+    def predict_document(self, doc: str) -> tuple:
+        counts = {}
+        for gram in _ngrams(doc, self.ngram_range):
+            if gram in self.terms:
+                counts[gram] = counts.get(gram, 0) + 1
+
+        weights = {}
+        for gram, tf in counts.items():
+            if self.sublinear_tf:
+                tf = 1 + math.log(tf)
+            weights[gram] = tf * self.terms[gram][0]
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+
+        scores = list(self.intercepts)
+        for gram, w in weights.items():
+            for j, coef in enumerate(self.terms[gram][1]):
+                scores[j] += coef * w / norm
+
+        agents, confidence = list(self.always), 1.0
+        for label, score in zip(self.labels, scores):
+            p = 1 / (1 + math.exp(-max(min(score, 50), -50)))
+            if p >= 0.5:
+                agents.append(label)
+            confidence = min(confidence, max(p, 1 - p))
+        return agents, confidence
+
+    def decide(self, event: dict, threshold: float = ROUTING_CLASSIFIER_THRESHOLD):
+        """
+        A {"selected_agents", "reason"} dict when confident enough, else None.
+        """
+        agents, confidence = self.predict(event)
+        if confidence < threshold:
+            return None
+        self.confident += 1
+        return {
+            "selected_agents": agents or ["monitoring"],
+            "reason": f"classifier (confidence {confidence:.2f})",
+        }
+
+    def stats(self) -> dict:
+        return {
+            "loaded": True,
+            "trained_at": self.trained_at,
+            "labels": self.labels,
+            "threshold": ROUTING_CLASSIFIER_THRESHOLD,
+            "predictions": self.predictions,
+            "confident": self.confident,
+            "confident_rate": self.confident / self.predictions if self.predictions else 0.0,
+            "avg_latency_ms": 1000 * self.latency_total / self.predictions if self.predictions else 0.0,
+        }
+
+
+def load_classifier(path: str = ROUTING_MODEL_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        model = RoutingClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[routing_classifier] could not load {path}: {e}")
+        return None
+    print(f"[routing_classifier] loaded {path} ({len(model.terms)} terms, labels {model.labels})")
+    return model
+
+
+ROUTING_CLASSIFIER = load_classifier()
+
+
+# --------------- offline training ---------------
+def _training_rows(rows: list) -> tuple:
+    docs, labels = [], []
+    for row in rows:
+        reason = (row.get("reason") or "").lower()
+        if reason.startswith(_SKIP_REASONS):
+            continue
+        event, agents = row["event_json"], row["selected_agents"]
+        if isinstance(event, str):
+            event = json.loads(event)
+        if isinstance(agents, str):
+            agents = json.loads(agents)
+        docs.append(event_document(event))
+        labels.append(sorted(set(agents) - _IMPLIED_AGENTS))
+    return docs, labels
+
+
+def train(docs: list, labels: list, ngram_range=(1, 2), min_df: int = 2, holdout: float = 0.2) -> tuple:
+    """
+    Fit the classifier; returns (exported model dict, holdout report).
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import MultiLabelBinarizer
+
+    order = list(range(len(docs)))
+    random.Random(0).shuffle(order)
+    n_test = int(len(order) * holdout)
+    test, fit = order[:n_test], order[n_test:]
+
+    vectorizer = TfidfVectorizer(ngram_range=ngram_range, min_df=min_df, sublinear_tf=True)
+    X = vectorizer.fit_transform([docs[i] for i in fit])
+    mlb = MultiLabelBinarizer()
+    Y = mlb.fit_transform([labels[i] for i in fit])
+
+    # a label set on every decision is always predicted; nothing to learn
+    kept, always, coefs, intercepts = [], [], [], []
+    for j, label in enumerate(mlb.classes_):
+        y = Y[:, j]
+        if y.min() == 1:
+            always.append(str(label))
+            continue
+        clf = LogisticRegression(C=10, max_iter=1000).fit(X, y)
+        kept.append(str(label))
+        coefs.append(clf.coef_[0])
+        intercepts.append(float(clf.intercept_[0]))
+
+    terms = {}
+    for term, idx in vectorizer.vocabulary_.items():
+        terms[term] = [float(vectorizer.idf_[idx]), [float(c[idx]) for c in coefs]]
+
+    model = {
+        "labels": kept,
+        "always": always,
+        "intercepts": intercepts,
+        "ngram_range": list(ngram_range),
+        "sublinear_tf": True,
+        "terms": terms,
+        "trained_at": time.time(),
+        "training_rows": len(fit),
+    }
+
+    report = {"train": len(fit), "holdout": len(test)}
+    if test:
+        clf = RoutingClassifier(model)
+        scored = []
+        for i in test:
+            agents, confidence = clf.predict_document(docs[i])
+            scored.append((confidence, sorted(agents) == labels[i]))
+        report["exact_match"] = sum(ok for _, ok in scored) / len(scored)
+        for threshold in (0.7, 0.8, 0.9, 0.95, 0.99):
+            confident = [ok for c, ok in scored if c >= threshold]
+            report[f"at_{threshold}"] = {
+                "coverage": len(confident) / len(scored),
+                "exact_match": sum(confident) / len(confident) if confident else None,
+            }
+    return model, report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Train the routing classifier on master_decision_table")
+    ap.add_argument("--out", default=ROUTING_MODEL_PATH)
+    ap.add_argument("--limit", type=int, default=100000, help="most recent decisions to train on")
+    ap.add_argument("--min-df", type=int, default=2)
+    ap.add_argument("--holdout", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    rows = asyncio.run(fetch_decision_history(args.limit))
+    docs, labels = _training_rows(rows)
+    print(f"[routing_classifier] {len(docs)} training decisions (of {len(rows)} rows)")
+    if len(docs) < 10:
+        raise SystemExit("not enough routed decisions to train on")
+
+    model, report = train(docs, labels, min_df=args.min_df, holdout=args.holdout)
+    with open(args.out, "w") as f:
+        json.dump(model, f)
+    print(json.dumps(report, indent=2))
+    print(f"[routing_classifier] wrote {args.out} ({len(model['terms'])} terms)")
+
+
+if __name__ == "__main__":
+    main()
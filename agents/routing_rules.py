@@ -0,0 +1,174 @@
+# agents/routing_rules.py
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+
+from database import fetch_routing_rules, fetch_routing_rules_version
+
+# how often the rules table is checked for changes
+ROUTING_RULES_RELOAD = float(os.getenv("ROUTING_RULES_RELOAD", 30))
+# routing decisions reused for events with the same signature
+ROUTING_MEMO_TTL = float(os.getenv("ROUTING_MEMO_TTL", 600))
+ROUTING_MEMO_MAX = int(os.getenv("ROUTING_MEMO_MAX", 5000))
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _lower_list(val) -> list:
+    if val is None:
+        return []
+    if not isinstance(val, list):
+        val = [val]
+    return [str(v).strip().lower() for v in val if v]
+
+
+def _event_text(event: dict) -> str:
+    parts = _lower_list(event.get("impact_description")) + _lower_list(event.get("actions"))
+    text = _DIGITS_RE.sub("#", " ".join(parts))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def event_signature(event: dict) -> tuple:
+    """
+    What routing depends on: types, severities and the description with
+    numbers masked. Airports, times and ids are left out.
+    """
+    return (
+        tuple(sorted(set(_lower_list(event.get("event_type"))))),
+        tuple(sorted(set(_lower_list(event.get("severity"))))),
+        _event_text(event),
+    )
+
+
+class _Rule:
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.name = row["name"]
+        self.event_types = set(_lower_list(row.get("event_types")))
+        self.severities = set(_lower_list(row.get("severities")))
+        keywords = _lower_list(row.get("keywords"))
+        self.keywords_re = (
+            re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")")
+            if keywords
+            else None
+        )
+        self.agents = list(row["agents"])
+
+    def matches(self, types: tuple, severities: tuple, text: str) -> bool:
+        # every type of the event must be covered, so mixed events go to the LLM
+        if self.event_types and (not types or not set(types) <= self.event_types):
+            return False
+        if self.severities and not self.severities & set(severities):
+            return False
+        if self.keywords_re is not None and not self.keywords_re.search(text):
+            return False
+        return True
+
+
+class RoutingRules:
+    """
+    In-memory matcher over the routing_rules table plus a TTL memo of
+    routing decisions keyed on event_signature(). lookup() answers from the
+    memo or the first matching rule (highest priority); None means the
+    event has to go to the LLM. The table is re-read when it changes.
+    """
+
+    def __init__(self, ttl: float = ROUTING_MEMO_TTL, max_entries: int = ROUTING_MEMO_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._rules = []
+        self._version = None
+        self._memo = OrderedDict()  # signature -> (expires_at, result)
+        self.loaded_at = None
+        self.rule_hits = {}
+        self.memo_hits = 0
+        self.unmatched = 0
+        self.lookups = 0
+
+    async def load(self) -> int:
+        version = await fetch_routing_rules_version()
+        rows = await fetch_routing_rules()
+        self._rules = [_Rule(r) for r in rows]
+        self._version = version
+        # decisions memoized under the old rules may no longer hold
+        self._memo.clear()
+        self.loaded_at = time.time()
+        print(f"[routing_rules] loaded {len(self._rules)} rules")
+        return len(self._rules)
+
+    async def reload_if_changed(self) -> bool:
+        if await fetch_routing_rules_version() == self._version:
+            return False
+        await self.load()
+        return True
+
+    async def watch(self, interval: float = ROUTING_RULES_RELOAD):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                print(f"[routing_rules] reload failed: {e}")
+
+    def lookup(self, event: dict):
+        """
+        Return a {"selected_agents", "reason"} dict or None.
+        """
+        self.lookups += 1
+        signature = event_signature(event)
+        cached = self._memo.get(signature)
+        if cached is not None:
+            expires_at, result = cached
+            if expires_at > time.monotonic():
+                self._memo.move_to_end(signature)
+                self.memo_hits += 1
+                return _copy(result)
+            del self._memo[signature]
+
+        types, severities, text = signature
+        for rule in self._rules:
+            if rule.matches(types, severities, text):
+                self.rule_hits[rule.name] = self.rule_hits.get(rule.name, 0) + 1
+                result = {"selected_agents": list(rule.agents), "reason": f"rule {rule.name}"}
+                self._remember(signature, result)
+                return _copy(result)
+        self.unmatched += 1
+        return None
+
+    def remember(self, event: dict, result: dict) -> None:
+        """
+        Memoize an LLM decision for events with the same signature.
+        """
+        self._remember(event_signature(event), result)
+
+    def _remember(self, signature: tuple, result: dict) -> None:
+        self._memo[signature] = (time.monotonic() + self.ttl, _copy(result))
+        self._memo.move_to_end(signature)
+        while len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+
+    def stats(self) -> dict:
+        rule_total = sum(self.rule_hits.values())
+        return {
+            "rules": len(self._rules),
+            "loaded_at": self.loaded_at,
+            "lookups": self.lookups,
+            "rule_hits": rule_total,
+            "rule_hit_rate": rule_total / self.lookups if self.lookups else 0.0,
+            "hits_by_rule": dict(self.rule_hits),
+            "memo_hits": self.memo_hits,
+            "memo_hit_rate": self.memo_hits / self.lookups if self.lookups else 0.0,
+            "memo_entries": len(self._memo),
+            "unmatched": self.unmatched,
+        }
+
+
+def _copy(result: dict) -> dict:
+    # callers append to selected_agents, so never hand out the stored list
+    return {**result, "selected_agents": list(result.get("selected_agents", []))}
+
+
+ROUTING_RULES = RoutingRules()
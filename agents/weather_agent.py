@@ -3,7 +3,7 @@ import sqlparse
 from tools.generate_and_execute_query import generate_and_execute_query
 
 from database import get_pool
-from tools.send_email import send_email
+from tools.send_email import send_email_async
 
 
 async def notify_rescheduled_passengers():
@@ -42,7 +42,7 @@ Regards,
 Airline Operations Team
 """
 
-        email_status = send_email(passenger_email, subject, body)
+        email_status = await send_email_async(passenger_email, subject, body)
 
         results.append(
             {
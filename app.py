@@ -1,125 +1,469 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import asyncio
-from parser import extract_text_from_pdf, parse_event_data
-from task_queue import TASK_QUEUE, task_worker
-from agents.routing_ai import ai_decide_agent
-from database import init_db, insert_master_decision, get_pool
-from decision_worker import decision_poller
-from agents.weather_agent import weather_agent
-from agents.crew_agent import crew_agent
-from agents.monitoring import monitoring_agent
-from agents.bomb_threat_agent import bomb_threat_agent
-from io import BytesIO
+from parser import (
+    stream_pdf_events,
+    extraction_cache,
+    extraction_path_stats,
+    start_process_pool,
+    shutdown_process_pool,
+)
+from task_queue import TASK_QUEUE, WORKER_POOL, PostgresTaskQueue, AGENT_REGISTRY
+from agents.routing_ai import ai_decide_agent, RoutingBatcher
+from agents.routing_rules import ROUTING_RULES
+from agents import routing_classifier
+from database import (
+    init_db,
+    decision_writer,
+    fetch_upload_job,
+    get_pool,
+    fetch_dead_letters,
+    take_dead_letters,
+)
+from decision_worker import (
+    decision_poller,
+    dispatch_decision,
+    dispatch_stats as decision_dispatch_counts,
+)
+from event_index import EVENT_INDEX
+from dispatcher import DISPATCHER
+from jobs import UploadJob, recover_jobs
+from event_stream import EVENT_BROKER, current_upload
+from uploads import spooled_pdfs
+from coalescer import TASK_COALESCER
 from dotenv import load_dotenv
 import json
 import os
-import requests
+import uuid
 
-url = "http://localhost:5000"
+# max events of one upload routed (LLM + DB + dispatch) at the same time
+ROUTING_CONCURRENCY = int(os.getenv("ROUTING_CONCURRENCY", 8))
+# seconds clients are told to wait when uploads are refused (429)
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", 30))
+# endpoints that create agent work and are refused while the task queue is saturated
+_ADMISSION_PATHS = {"/upload", "/upload/batch", "/jobs"}
 
 load_dotenv()
 
-AGENT_MAP = {
-    "weather_agent": weather_agent,
-    "crew_agent": crew_agent,
-    "monitoring": monitoring_agent,
-    "bomb_threat_agent": bomb_threat_agent,
-}
-
 app = FastAPI()
+_routing_semaphore = asyncio.Semaphore(ROUTING_CONCURRENCY)
+_job_tasks = set()
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # checked before the upload body is read
+    if (
+        request.method == "POST"
+        and request.url.path in _ADMISSION_PATHS
+        and TASK_QUEUE.saturated()
+    ):
+        return JSONResponse(
+            status_code=429,
+            content={
+                "detail": "Agent task queue is saturated, retry later",
+                "queue_depth": TASK_QUEUE.depth(),
+            },
+            headers={"Retry-After": str(UPLOAD_RETRY_AFTER)},
+        )
+    return await call_next(request)
 
 
 @app.on_event("startup")
 async def startup_event():
+    # PDF extraction pool: started before any upload, so the first one does
+    # not wait for the children to come up
+    await asyncio.get_running_loop().run_in_executor(start_process_pool(), os.getpid)
     # init DB (create table if not exists)
     await init_db()
-    # start task worker
-    asyncio.create_task(task_worker())
+    # seed the duplicate-event index from recently stored decisions
+    loaded = await EVENT_INDEX.load_recent()
+    print(f"[app] event index loaded {loaded} recent decisions")
+    # routing rules answer trivially classifiable events without the LLM
+    await ROUTING_RULES.load()
+    asyncio.create_task(ROUTING_RULES.watch())
+    interrupted = await recover_jobs()
+    if interrupted:
+        print(f"[app] marked {interrupted} interrupted upload jobs as failed")
+    # start disruption service dispatcher
+    await DISPATCHER.start()
+    # start agent task workers
+    await WORKER_POOL.start()
     # start decision poller
     asyncio.create_task(decision_poller())
 
 
-async def enqueue_agents_for_decision(selected_agents, event_json):
+@app.on_event("shutdown")
+async def shutdown_event():
+    await TASK_COALESCER.flush()
+    await WORKER_POOL.stop()
+    await DISPATCHER.stop()
+    await asyncio.to_thread(shutdown_process_pool)
+
+
+async def enqueue_agents_for_decision(decision_id, selected_agents, event_json):
     # Ensure monitoring always present
     if "monitoring" not in selected_agents:
         selected_agents.append("monitoring")
-    for agent_name in selected_agents:
-        agent_callable = AGENT_MAP.get(agent_name)
-        if not agent_callable:
-            print(f"[app] unknown agent {agent_name} - skipping")
-            continue
-        await TASK_QUEUE.put((agent_callable, event_json))
+    # claim-based: agents the poller (or another process) already took are skipped
+    enqueued = await dispatch_decision(decision_id, selected_agents, event_json)
+    EVENT_BROKER.publish(
+        "dispatched",
+        {"event_id": event_json.get("event_id"), "decision_id": decision_id, "agents": enqueued},
+    )
 
 
-@app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
+async def route_event(event: dict, decide=None) -> dict:
+    # Same airport/type with an overlapping window was already routed (in this
+    # upload or within MERGE_WINDOW_HOURS): reuse that decision
+    duplicate = EVENT_INDEX.match(event)
+    if duplicate:
+        if duplicate["ready"] is not None:
+            # the original is still being routed concurrently
+            await duplicate["ready"]
+        if duplicate["decision_id"] is not None:
+            EVENT_INDEX.count_saved(duplicate)
+            EVENT_BROKER.publish(
+                "merged",
+                {"event_id": event.get("event_id"), "merged_into": duplicate["decision_id"]},
+            )
+            return {
+                "event_id": event.get("event_id"),
+                "decision_id": duplicate["decision_id"],
+                "selected_agents": [],
+                "reason": f"duplicate of event {duplicate['event_id']}",
+                "merged_into": duplicate["decision_id"],
+            }
+
+    # reserve the index slot so concurrent duplicates wait for this decision
+    entry = EVENT_INDEX.add(event, None, [])
+    if entry is not None:
+        entry["ready"] = asyncio.get_running_loop().create_future()
+    try:
+        result = await _route_new_event(event, decide)
+        if entry is not None:
+            entry["decision_id"] = result["decision_id"]
+            entry["selected_agents"] = list(result["selected_agents"])
+        return result
+    except BaseException:
+        if entry is not None:
+            EVENT_INDEX.remove(entry)
+        raise
+    finally:
+        if entry is not None:
+            entry["ready"].set_result(None)
+            entry["ready"] = None
+
+
+async def _route_new_event(event: dict, decide=None) -> dict:
+    # Ask AI which agents should run for this event
+    if decide is not None:
+        ai_result = await decide(event)
+    else:
+        ai_result = await ai_decide_agent(event, db_rules=None)  # optionally pass db rules
+    selected_agents = ai_result.get("selected_agents", ["monitoring"])
+    reason = ai_result.get("reason", "")
+    EVENT_BROKER.publish(
+        "routed",
+        {"event_id": event.get("event_id"), "selected_agents": selected_agents, "reason": reason},
+    )
+
+    # Save decision to DB (batched with the other decisions routed alongside it)
+    decision_row = await decision_writer.insert(
+        event_id=event.get("event_id")
+        or str(event.get("impact_description", [""])[0])[:10],
+        event_json=event,
+        selected_agents=selected_agents,
+        reason=reason,
+    )
+    EVENT_BROKER.publish(
+        "persisted",
+        {"event_id": event.get("event_id"), "decision_id": decision_row.get("id")},
+    )
+    dispatch_id = None
+    if event["event_type"][0].lower() in ("weather", "bomb"):
+        data = {
+            "type": event["event_type"][0].lower(),
+            "severity": event.get("severity"),
+            "airport_code": event.get("airport_code"),
+            "alternate_airport": None
+        }
+        # sent in the background; poll GET /dispatch/{dispatch_id} for the outcome
+        dispatch_id = DISPATCHER.submit(data)
+
+    # Immediately enqueue agents for low-latency response
+    await enqueue_agents_for_decision(decision_row.get("id"), selected_agents, event)
+
+    return {
+        "event_id": event.get("event_id"),
+        "decision_id": decision_row.get("id"),
+        "selected_agents": selected_agents,
+        "reason": reason,
+        "dispatch_id": dispatch_id,
+    }
+
+
+async def _route_bounded(event: dict, decide=None, job=None) -> dict:
+    async with _routing_semaphore:
+        result = await route_event(event, decide)
+    if job is not None:
+        await job.add_routing(result)
+    return result
+
+
+async def process_pdf(pdf, job=None, upload_id: str = None):
+    """
+    Extract, parse and route one PDF (bytes or a file path); returns
+    (events, routing_results).
+    Pages are extracted in the process pool and events stream in page by page;
+    each event is routed concurrently (up to ROUTING_CONCURRENCY) while later
+    pages are parsed. Events arriving close together share one routing LLM
+    call. Results keep the input order. Progress is published to
+    GET /events/stream under upload_id (the job id in job mode).
+    """
+    # routing tasks copy this context, so their progress carries the upload id
+    current_upload.set(upload_id or (job.id if job is not None else None))
+    batcher = RoutingBatcher(db_rules=None)
+    events = []
+    routing_tasks = []
+    try:
+        async for event in stream_pdf_events(pdf):
+            events.append(event)
+            EVENT_BROKER.publish("extracted", event)
+            if job is not None:
+                await job.add_event(event)
+            routing_tasks.append(
+                asyncio.create_task(_route_bounded(event, batcher.decide, job))
+            )
+    except BaseException:
+        for task in routing_tasks:
+            task.cancel()
+        raise
+
+    if job is not None:
+        await job.set_stage("routing")
+    routing_results = await asyncio.gather(*routing_tasks)
+    EVENT_BROKER.publish("completed", {"events": len(events)})
+    return events, list(routing_results)
+
+
+def _check_pdf(file: UploadFile):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted")
 
+
+@app.post("/upload")
+async def upload_pdf(file: UploadFile = File(...), upload_id: str = None):
+    """
+    Pass upload_id (any client-chosen string) and subscribe to
+    GET /events/stream?upload_id=... first to watch this upload progress.
+    """
+    _check_pdf(file)
     pdf_bytes = await file.read()
-    pdf_file = BytesIO(pdf_bytes)
-    text = extract_text_from_pdf(pdf_file)
+    upload_id = upload_id or uuid.uuid4().hex
 
-    events = await parse_event_data(text)
+    events, routing_results = await process_pdf(pdf_bytes, upload_id=upload_id)
 
     if not events:
-        return {"events": [], "message": "No events parsed"}
-
-    routing_results = []
-    for event in events:
-        # Ask AI which agents should run for this event
-        ai_result = await ai_decide_agent(
-            event, db_rules=None
-        )  # optionally pass db rules
-        selected_agents = ai_result.get("selected_agents", ["monitoring"])
-        reason = ai_result.get("reason", "")
-
-        # Save decision to DB
-        decision_row = await insert_master_decision(
-            event_id=event.get("event_id")
-            or str(event.get("impact_description", [""])[0])[:10],
-            event_json=event,
-            selected_agents=selected_agents,
-            reason=reason,
-        )
-        if event["event_type"][0].lower() in ("weather", "bomb"):
-            data = {
-                "type": event["event_type"][0].lower(),
-                "severity": event.get("severity"),
-                "airport_code": event.get("airport_code"),
-                "alternate_airport": None
-            }
+        return {"upload_id": upload_id, "events": [], "message": "No events parsed"}
 
-            DISRUPTION_API_URL = f"{url}/disruption/city"
-            try:
-                response = requests.post(
-                    DISRUPTION_API_URL,
-                    json=data,
-                    timeout=5
-                )
-                print("Disruption API status:", response.status_code)
-                try:
-                    print("Disruption API response:", response.json())
-                except ValueError:
-                    print("Disruption API response (text):", response.text)
+    merged = sum(1 for r in routing_results if r.get("merged_into"))
+    return {
+        "upload_id": upload_id,
+        "events": events,
+        "routing": routing_results,
+        "duplicates_merged": merged,
+    }
 
-            except requests.exceptions.RequestException as e:
-                print("Disruption API call failed:", str(e))
 
+async def _process_spooled(spooled) -> dict:
+    upload_id = uuid.uuid4().hex
+    result = {"filename": spooled.filename, "bytes": spooled.size, "upload_id": upload_id}
+    try:
+        events, routing_results = await process_pdf(spooled.path, upload_id=upload_id)
+    except Exception as e:
+        print(f"[app] failed to process {spooled.filename}: {e}")
+        return {**result, "error": str(e)}
+    merged = sum(1 for r in routing_results if r.get("merged_into"))
+    return {
+        **result,
+        "events": events,
+        "routing": routing_results,
+        "duplicates_merged": merged,
+    }
 
-        # Immediately enqueue agents for low-latency response
-        await enqueue_agents_for_decision(selected_agents, event)
 
-        routing_results.append(
-            {
-                "event_id": event.get("event_id"),
-                "decision_id": decision_row.get("id"),
-                "selected_agents": selected_agents,
-                "reason": reason,
-            }
-        )
+@app.post("/upload/batch")
+async def upload_pdf_batch(request: Request):
+    """
+    Multi-file /upload (multipart/form-data, one or more PDF parts). Each part
+    is streamed to a temp file and memory-mapped for extraction, so memory
+    use does not grow with PDF size; files go through the pipeline
+    concurrently. Limits: UPLOAD_MAX_REQUEST_BYTES, UPLOAD_MAX_FILE_BYTES,
+    UPLOAD_MAX_FILES (413 when exceeded).
+    """
+    async with spooled_pdfs(request) as files:
+        results = await asyncio.gather(*(_process_spooled(f) for f in files))
+    return {"files": list(results)}
+
+
+async def _run_job(job: UploadJob, pdf_bytes: bytes):
+    try:
+        await job.set_stage("parsing")
+        _, routing_results = await process_pdf(pdf_bytes, job)
+        await job.complete(routing_results)
+    except Exception as e:
+        await job.fail(e)
+        EVENT_BROKER.publish("failed", {"error": str(e)}, upload_id=job.id)
+
+
+@app.post("/jobs", status_code=202)
+async def create_upload_job(file: UploadFile = File(...)):
+    """
+    Job mode of /upload: accepts the PDF, returns a job id right away and
+    processes it in the background. Poll GET /jobs/{job_id} for progress.
+    """
+    _check_pdf(file)
+    pdf_bytes = await file.read()
+
+    job = await UploadJob.create(file.filename)
+    task = asyncio.create_task(_run_job(job, pdf_bytes))
+    # keep a reference so the task is not garbage collected mid-run
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return {"job_id": job.id, "stage": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = await fetch_upload_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    job["events_parsed"] = len(job["events"])
+    return job
+
+
+@app.get("/events/stream")
+async def event_stream(request: Request, upload_id: str = None):
+    """
+    Server-sent events for every parsed event as it is extracted, routed,
+    persisted and dispatched to agents. Filter with upload_id (or a job id);
+    without it all uploads are streamed. A subscriber that falls behind loses
+    its oldest messages and receives a "dropped" event with the count.
+    """
+    return StreamingResponse(
+        EVENT_BROKER.stream(upload_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/events/stream/stats")
+async def event_stream_stats():
+    return EVENT_BROKER.stats()
+
+
+@app.get("/parser/cache")
+async def parser_cache_stats():
+    return extraction_cache.stats()
+
+
+@app.get("/parser/stats")
+async def parser_stats():
+    return extraction_path_stats()
+
+
+@app.get("/events/merge-stats")
+async def event_merge_stats():
+    return EVENT_INDEX.stats()
+
+
+@app.get("/routing/rules/stats")
+async def routing_rule_stats():
+    return ROUTING_RULES.stats()
+
+
+@app.post("/routing/rules/reload")
+async def reload_routing_rules():
+    return {"rules": await ROUTING_RULES.load()}
+
+
+@app.get("/routing/classifier/stats")
+async def routing_classifier_stats():
+    if routing_classifier.ROUTING_CLASSIFIER is None:
+        return {"loaded": False, "model_path": routing_classifier.ROUTING_MODEL_PATH}
+    return routing_classifier.ROUTING_CLASSIFIER.stats()
+
+
+@app.post("/routing/classifier/reload")
+async def reload_routing_classifier():
+    """
+    Pick up a model retrained with `python -m agents.routing_classifier`.
+    """
+    routing_classifier.ROUTING_CLASSIFIER = routing_classifier.load_classifier()
+    return await routing_classifier_stats()
+
+
+@app.get("/decisions/dispatch-stats")
+async def decision_dispatch_stats():
+    return decision_dispatch_counts()
+
+
+@app.get("/workers")
+async def worker_stats():
+    return WORKER_POOL.stats()
+
+
+@app.get("/tasks/queue")
+async def task_queue_stats():
+    stats = {
+        "depth": TASK_QUEUE.qsize(),
+        "coalescing": TASK_COALESCER.stats(),
+        "admission": TASK_QUEUE.admission_stats(),
+        "agents": TASK_QUEUE.stats(),
+        "priorities": TASK_QUEUE.priority_stats(),
+    }
+    if isinstance(TASK_QUEUE, PostgresTaskQueue):
+        stats["durable"] = await TASK_QUEUE.durable_stats()
+    return stats
+
+
+@app.get("/dead-letters")
+async def list_dead_letters(agent: str = None, limit: int = Query(100, le=1000)):
+    return await fetch_dead_letters(agent, limit)
+
+
+@app.post("/dead-letters/redrive")
+async def redrive_dead_letters(
+    ids: list[int] = Query(None), agent: str = None, limit: int = Query(100, le=1000)
+):
+    """
+    Put dead letters back on the task queue (all, one agent's, or the given
+    ids). Only those the queue accepted are removed from the table; tasks
+    shed by admission control stay and are reported.
+    """
+    if agent is not None and agent not in AGENT_REGISTRY:
+        raise HTTPException(status_code=400, detail=f"Unknown agent {agent}")
+    agents = [agent] if agent else list(AGENT_REGISTRY)
+
+    async def enqueue(row) -> bool:
+        return await TASK_QUEUE.put((AGENT_REGISTRY[row["agent"]], row["payload"]))
+
+    redriven, shed = await take_dead_letters(agents, ids, limit, enqueue)
+    return {"redriven": len(redriven), "ids": redriven, "shed": shed}
+
+
+@app.get("/dispatch")
+async def dispatch_stats():
+    return DISPATCHER.stats()
+
 
-    return {"events": events, "routing": routing_results}
+@app.get("/dispatch/{dispatch_id}")
+async def dispatch_status(dispatch_id: str):
+    status = DISPATCHER.status(dispatch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown dispatch id")
+    return status
 
 
 def normalize_event(event: dict) -> dict:
@@ -0,0 +1,189 @@
+# benchmarks/bench_parser.py
+"""
+Parser throughput benchmark. Runs fully offline: synthetic bulletins are
+generated in memory and the OpenAI client is pointed at a local stand-in.
+
+    python -m benchmarks.bench_parser --pages 1 10 100 500 --latency 0.5
+
+Reports pages/sec for PDF extraction (serial and process pool), chunks/sec
+for chunking, ops/sec for _repair_and_load_json, and end-to-end latency,
+time-to-first-event and event recall for parse_event_data / stream_pdf_events.
+Pass --memory to also record the peak Python allocation of each stage.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+from benchmarks.fake_openai import fake_completion, start_server
+from benchmarks.synthetic import make_bulletin
+
+
+def _measure(fn, memory: bool):
+    """
+    Run fn() once; returns (result, seconds, peak_bytes or None).
+    """
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _recall(events, known) -> float:
+    found = {ev.get("event_id") for ev in events}
+    return sum(1 for k in known if k["event_id"] in found) / len(known) if known else 1.0
+
+
+async def _stream(parser, pdf_bytes):
+    t0 = time.perf_counter()
+    first = None
+    events = []
+    async for ev in parser.stream_pdf_events(pdf_bytes):
+        if first is None:
+            first = time.perf_counter() - t0
+        events.append(ev)
+    return events, first
+
+
+def bench_one(parser, n_pages: int, args) -> dict:
+    pdf_bytes, known = make_bulletin(n_pages, events_per_page=args.events_per_page)
+    row = {"pages": n_pages, "pdf_kb": round(len(pdf_bytes) / 1024, 1), "known_events": len(known)}
+
+    text, t, peak = _measure(lambda: parser.extract_text_from_pdf(BytesIO(pdf_bytes)), args.memory)
+    row["extract_pages_per_s"] = round(n_pages / t, 1)
+    row["extract_peak_kb"] = peak and round(peak / 1024)
+
+    _, t, _ = _measure(
+        lambda: asyncio.run(parser.extract_text_from_pdf_async(pdf_bytes)), False
+    )
+    row["extract_pool_pages_per_s"] = round(n_pages / t, 1)
+
+    chunks, t, peak = _measure(lambda: list(parser.iter_text_chunks([text])), args.memory)
+    row["chunks"] = len(chunks)
+    row["chunk_per_s"] = round(len(chunks) / t, 1) if t else None
+    row["chunk_peak_kb"] = peak and round(peak / 1024)
+
+    # model outputs for every chunk, plus a truncated copy of each
+    raws = [fake_completion(f"PDF_CHUNK:\n{c}") for c in chunks]
+    raws += [r[: int(len(r) * 0.8)] for r in raws if len(r) > 2]
+
+    def _repair_all():
+        n = 0
+        for _ in range(args.repair_rounds):
+            for raw in raws:
+                try:
+                    parser._repair_and_load_json(raw)
+                except json.JSONDecodeError:
+                    pass
+                n += 1
+        return n
+
+    n, t, _ = _measure(_repair_all, False)
+    row["repair_ops_per_s"] = round(n / t) if t else None
+
+    parser.extraction_cache.clear()
+    events, t, peak = _measure(lambda: asyncio.run(parser.parse_event_data(text)), args.memory)
+    row["parse_s"] = round(t, 3)
+    row["parse_chunks_per_s"] = round(len(chunks) / t, 1)
+    row["parse_peak_kb"] = peak and round(peak / 1024)
+    row["events"] = len(events)
+    row["recall"] = round(_recall(events, known), 3)
+
+    parser.extraction_cache.clear()
+    (events, first), t, _ = _measure(lambda: asyncio.run(_stream(parser, pdf_bytes)), False)
+    row["e2e_s"] = round(t, 3)
+    row["first_event_s"] = first and round(first, 3)
+    row["e2e_recall"] = round(_recall(events, known), 3)
+    return row
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 200, 500])
+    ap.add_argument("--events-per-page", type=int, default=2)
+    ap.add_argument("--latency", type=float, default=0.2, help="seconds before the stand-in answers")
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds per streamed token")
+    ap.add_argument("--repair-rounds", type=int, default=20)
+    ap.add_argument("--no-fast-path", action="store_true", help="send every chunk to the stand-in LLM")
+    ap.add_argument("--memory", action="store_true", help="record tracemalloc peaks (slower)")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    ap.add_argument(
+        "--tiktoken",
+        action="store_true",
+        help="count tokens with tiktoken (its BPE file must already be in TIKTOKEN_CACHE_DIR)",
+    )
+    args = ap.parse_args(argv)
+
+    server, base_url = start_server(args.latency, args.token_delay)
+    cache_dir = tempfile.mkdtemp(prefix="bench_parser_")
+    # must be set before parser is imported: it builds the client and cache at import
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ["EXTRACTION_CACHE_PATH"] = os.path.join(cache_dir, "cache.sqlite3")
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+    import parser
+
+    parser.FAST_PATH_ENABLED = not args.no_fast_path
+    # children start on first use; keep that out of the first row
+    parser.start_process_pool().submit(os.getpid).result()
+    if not args.tiktoken:
+        # tiktoken downloads its BPE file on first use; stay offline and estimate
+        parser._encoding = False
+
+    rows = []
+    for n_pages in args.pages:
+        rows.append(bench_one(parser, n_pages, args))
+        if not args.json:
+            print(rows[-1], file=sys.stderr)
+
+    summary = {
+        "rows": rows,
+        "llm_requests": server.RequestHandlerClass.requests,
+        "path_stats": parser.extraction_path_stats(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    cols = [
+        ("pages", "pages"),
+        ("extract_pages_per_s", "pages/s"),
+        ("extract_pool_pages_per_s", "pool pages/s"),
+        ("chunks", "chunks"),
+        ("chunk_per_s", "chunks/s"),
+        ("repair_ops_per_s", "repair/s"),
+        ("parse_s", "parse s"),
+        ("parse_chunks_per_s", "parse chunks/s"),
+        ("first_event_s", "1st event s"),
+        ("e2e_s", "e2e s"),
+        ("recall", "recall"),
+    ]
+    if args.memory:
+        cols += [("extract_peak_kb", "extract KB"), ("parse_peak_kb", "parse KB")]
+    print(" | ".join(h for _, h in cols))
+    for row in rows:
+        print(" | ".join(str(row.get(k)) for k, _ in cols))
+    print(
+        f"llm requests: {summary['llm_requests']}  "
+        f"path stats: {summary['path_stats']}  max RSS: {summary['max_rss_kb']} KB"
+    )
+
+
+if __name__ == "__main__":
+    main()
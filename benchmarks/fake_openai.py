@@ -0,0 +1,138 @@
+# benchmarks/fake_openai.py
+"""
+Local stand-in for the OpenAI chat completions endpoint. It "extracts" the
+synthetic bulletin events from the prompt with a regex and answers after a
+configurable latency, streaming or not. Point the client at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_EVENT_RE = re.compile(
+    r"Event ID: (\S+)\s+(.*?)(?=Event ID:|### CHUNK|$)", re.S
+)
+_CHUNK_RE = re.compile(r"### CHUNK (\d+) ###\n(.*?)(?=### CHUNK|\Z)", re.S)
+_AIRPORT_RE = re.compile(r"\(([A-Z]{3})\)")
+_WINDOW_RE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}) (\d{2}:\d{2})\s*(?:-|to)\s*(\d{2}:\d{2})"
+)
+_SEVERITY_RE = re.compile(r"\b(Low|Medium|High|Critical)\b")
+
+
+def _events_for(text: str, chunk=None) -> list:
+    events = []
+    for event_id, body in _EVENT_RE.findall(text):
+        ap = _AIRPORT_RE.search(body)
+        window = _WINDOW_RE.search(body)
+        sev = _SEVERITY_RE.search(body)
+        ev = {
+            "event_id": event_id,
+            "event_type": ["Other"],
+            "severity": [sev.group(1) if sev else "Low"],
+            "impact_description": [body.strip().split("\n")[0][:80]],
+            "airport_code": [ap.group(1)] if ap else [],
+            "start_time": f"{window.group(1)} {window.group(2)}" if window else "",
+            "end_time": f"{window.group(1)} {window.group(3)}" if window else "",
+            "actions": ["Inform passengers"],
+        }
+        if chunk is not None:
+            ev["chunk"] = chunk
+        events.append(ev)
+    return events
+
+
+def fake_completion(prompt: str) -> str:
+    if "### CHUNK" in prompt:
+        body = prompt.split("PDF_CHUNKS:", 1)[-1]
+        events = []
+        for idx, text in _CHUNK_RE.findall(body):
+            events += _events_for(text, int(idx))
+    else:
+        events = _events_for(prompt.split("PDF_CHUNK:", 1)[-1])
+    return json.dumps(events)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_delay = 0.0
+    requests = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        req = json.loads(self.rfile.read(length))
+        with self._lock:
+            type(self).requests += 1
+        prompt = req["messages"][-1]["content"]
+        content = fake_completion(prompt)
+        model = req.get("model", "gpt-4")
+        time.sleep(self.latency)
+
+        if not req.get("stream"):
+            body = json.dumps(
+                {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        # ~4 characters per token, like the real stream
+        for i in range(0, len(content), 16):
+            part = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": {"content": content[i : i + 16]}, "finish_reason": None}
+                ],
+            }
+            self.wfile.write(b"data: " + json.dumps(part).encode() + b"\n\n")
+            self.wfile.flush()
+            if self.token_delay:
+                time.sleep(self.token_delay * 4)
+        # the last chunk carries the finish reason, like the real stream
+        part = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        self.wfile.write(b"data: " + json.dumps(part).encode() + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_server(latency: float = 0.0, token_delay: float = 0.0):
+    """
+    Start the stand-in on a free local port; returns (server, base_url).
+    """
+    handler = type("Handler", (_Handler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
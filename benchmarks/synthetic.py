@@ -0,0 +1,131 @@
+# benchmarks/synthetic.py
+"""
+Synthetic IRROPS bulletins with known events, written as minimal PDFs
+(Helvetica text, one content stream per page) so no PDF library is needed.
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+AIRPORTS = ["DEL", "BOM", "BLR", "MAA", "CCU", "HYD", "GOI", "PNQ", "COK", "AMD"]
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+
+# well-formed templates: one event type, explicit severity, airport and window
+TEMPLATES = [
+    ("Weather", "Dense fog expected at ({ap}) between {start} - {end}. Severity: {sev}. Visibility below 200m."),
+    ("Threat", "Bomb threat reported at ({ap}) from {start} to {end}. {sev} severity. Terminal 2 evacuated."),
+    ("Crew", "Crew shortage at ({ap}) between {start} - {end} due to sick leave. Severity: {sev}."),
+    ("Traffic", "Runway closure at ({ap}) from {start} to {end} for resurfacing. Severity: {sev}."),
+]
+# free text with mixed signals: the fast path declines these and they go to the LLM
+AMBIGUOUS = "Crew rest issues and thunderstorms near ({ap}) may disrupt operations from {start} to {end}. Severity: {sev}."
+
+FILLER = [
+    "Passenger services desk staffing follows the published roster.",
+    "Lounge access and baggage services remain unchanged.",
+    "Refer to the operations manual section 4 for contact numbers.",
+    "Gate allocation follows the seasonal plan.",
+]
+
+LINES_PER_PAGE = 48
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    objs = []
+
+    def add(body: bytes) -> int:
+        objs.append(body)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 9 Tf 11 TL 40 780 Td"]
+        ops += [f"({_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                % (pages_id, font, content)
+            )
+        )
+    objs[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids),
+        len(kids),
+    )
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objs) + 1,
+        catalog,
+        xref,
+    )
+    return bytes(out)
+
+
+def make_bulletin(
+    n_pages: int, events_per_page: int = 2, ambiguous_ratio: float = 0.25, seed: int = 7
+) -> Tuple[bytes, List[Dict]]:
+    """
+    Returns (pdf_bytes, known_events). Every event starts with an
+    "Event ID:" line so it can be checked against the extracted events.
+    """
+    rng = random.Random(seed)
+    known = []
+    pages = []
+    used = set()
+    n = 0
+    for p in range(n_pages):
+        lines = [f"IRROPS OPERATIONS BULLETIN - page {p + 1}"]
+        day = (date(2025, 1, 1) + timedelta(days=p // 4)).isoformat()
+        for _ in range(events_per_page):
+            n += 1
+            sev = rng.choice(SEVERITIES)
+            # distinct airport/window per event so none are legitimately merged
+            while True:
+                ap = rng.choice(AIRPORTS)
+                hour, minute = rng.randint(0, 20), rng.choice(["00", "15", "30", "45"])
+                if (ap, day, hour, minute) not in used:
+                    used.add((ap, day, hour, minute))
+                    break
+            start = f"{day} {hour:02d}:{minute}"
+            end = f"{hour + rng.randint(1, 3):02d}:30"
+            if rng.random() < ambiguous_ratio:
+                event_type, text = "Other", AMBIGUOUS
+            else:
+                event_type, text = rng.choice(TEMPLATES)
+            event_id = f"EVT-{n:05d}"
+            lines.append(f"Event ID: {event_id}")
+            lines.append(text.format(ap=ap, start=start, end=end, sev=sev))
+            lines.append("Actions: Inform passengers; Review schedule")
+            known.append(
+                {
+                    "event_id": event_id,
+                    "event_type": event_type,
+                    "airport_code": ap,
+                    "severity": sev,
+                    "start": start,
+                    "end": end,
+                }
+            )
+        while len(lines) < LINES_PER_PAGE:
+            lines.append(rng.choice(FILLER))
+        pages.append(lines)
+    return make_pdf(pages), known
@@ -0,0 +1,200 @@
+# coalescer.py
+import asyncio
+import os
+import time
+import traceback
+from datetime import datetime
+
+from event_fields import TIME_FORMAT
+from event_index import event_interval
+from task_queue import SEVERITY_PRIORITY, TASK_QUEUE, TaskQueue, agent_name
+
+# seconds a task for a coalescing agent waits for more events at the same airport
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", 30))
+# agents (function names) whose tasks are coalesced; monitoring should see every event
+COALESCE_AGENTS = set(
+    a.strip() for a in os.getenv("COALESCE_AGENTS", "weather_agent").split(",") if a.strip()
+)
+# a group is flushed early once it holds this many events
+COALESCE_MAX_EVENTS = int(os.getenv("COALESCE_MAX_EVENTS", 20))
+
+
+def _airport(payload) -> str:
+    airport = payload.get("airport_code") if isinstance(payload, dict) else None
+    if isinstance(airport, list):
+        airport = airport[0] if len(airport) == 1 else None
+    return str(airport).strip().upper() if airport else None
+
+
+def _flatten(values: list) -> list:
+    # parser events carry most fields as lists; de-duplicate without hashing
+    out = []
+    for val in values:
+        for item in val if isinstance(val, list) else [val]:
+            if item not in (None, "") and item not in out:
+                out.append(item)
+    return out
+
+
+def _first(val):
+    return val[0] if isinstance(val, list) and val else val
+
+
+def merge_events(events: list) -> dict:
+    """
+    One event standing for several at the same airport: combined id and
+    description, the union of their time windows, the highest severity, and
+    the original ids in `coalesced_events`. List-valued fields stay lists.
+    """
+    first = events[0]
+    merged = dict(first)
+    ids = [str(e.get("event_id")) for e in events]
+    merged["event_id"] = "+".join(ids)
+    merged["coalesced_events"] = ids
+
+    descriptions = _flatten([e.get("impact_description") for e in events])
+    if isinstance(first.get("impact_description"), list):
+        merged["impact_description"] = descriptions
+    else:
+        merged["impact_description"] = "\n".join(str(d) for d in descriptions)
+
+    merged["actions"] = _flatten([e.get("actions") for e in events])
+
+    types = _flatten([e.get("event_type") for e in events])
+    if isinstance(first.get("event_type"), list) or len(types) > 1:
+        merged["event_type"] = types
+    else:
+        merged["event_type"] = types[0] if types else None
+
+    severities = [
+        str(_first(e.get("severity"))).strip() for e in events if _first(e.get("severity"))
+    ]
+    if severities:
+        top = min(severities, key=lambda s: SEVERITY_PRIORITY.get(s.lower(), 2))
+        merged["severity"] = [top] if isinstance(first.get("severity"), list) else top
+
+    intervals = [event_interval(e) for e in events]
+    start = min(s for s, _ in intervals)
+    end = max(e for _, e in intervals)
+    merged["start_time"] = start.strftime(TIME_FORMAT) if start != datetime.min else None
+    merged["end_time"] = end.strftime(TIME_FORMAT) if end != datetime.max else None
+    return merged
+
+
+class TaskCoalescer:
+    """
+    Stage in front of the task queue. Tasks for COALESCE_AGENTS are held for
+    COALESCE_WINDOW seconds per (agent, airport); everything that arrives in
+    that window is merged into a single invocation. Other tasks pass straight
+    through.
+
+    With the postgres backend nothing is held here: durable_group() gives
+    the key and window under which the task is written to agent_tasks, and
+    PostgresTaskQueue merges the group when it claims it.
+    """
+
+    def __init__(
+        self,
+        queue: TaskQueue = TASK_QUEUE,
+        window: float = COALESCE_WINDOW,
+        agents: set = COALESCE_AGENTS,
+        max_events: int = COALESCE_MAX_EVENTS,
+    ):
+        self.queue = queue
+        self.window = window
+        self.agents = set(agents)
+        self.max_events = max_events
+        self._groups = {}  # (agent, airport) -> {"callable", "events", "opened", "timer"}
+        self.held = 0
+        self.invocations = 0
+        self.coalesced = 0
+
+    def _key(self, item):
+        name = agent_name(item[0])
+        airport = _airport(item[1])
+        if self.window <= 0 or name not in self.agents or airport is None:
+            return None
+        return name, airport
+
+    def durable_group(self, item):
+        """
+        (coalesce key, window) for a task queued in Postgres, or None.
+        """
+        key = self._key(item)
+        return (f"{key[0]}:{key[1]}", self.window) if key else None
+
+    async def put(self, item) -> None:
+        key = self._key(item)
+        if key is None:
+            await self.queue.put(item)
+            return
+
+        agent_callable, payload = item[0], item[1]
+        group = self._groups.get(key)
+        if group is None:
+            group = {"callable": agent_callable, "events": [], "opened": time.monotonic()}
+            group["timer"] = asyncio.create_task(self._flush_after(key, self.window))
+            self._groups[key] = group
+        group["events"].append(payload)
+        self.held += 1
+        if len(group["events"]) >= self.max_events:
+            group["timer"].cancel()
+            await self._flush(key)
+
+    async def _flush_after(self, key: tuple, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self._flush(key)
+        except Exception as e:
+            # nobody awaits this task, so make sure the failure is seen
+            print(f"[coalescer] flush of {key[0]} at {key[1]} failed: {e!r}")
+            traceback.print_exc()
+
+    async def _flush(self, key: tuple) -> None:
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        events = group["events"]
+        self.held -= len(events)
+        self.invocations += 1
+        if len(events) == 1:
+            await self.queue.put((group["callable"], events[0]))
+            return
+        try:
+            merged = merge_events(events)
+        except Exception as e:
+            # never drop the group: fall back to one run per event
+            print(f"[coalescer] could not merge {key[0]} at {key[1]}: {e!r}")
+            traceback.print_exc()
+            self.invocations += len(events) - 1
+            for payload in events:
+                await self.queue.put((group["callable"], payload))
+            return
+        self.coalesced += len(events) - 1
+        print(f"[coalescer] {key[0]} at {key[1]}: {len(events)} events in one run")
+        await self.queue.put((group["callable"], merged))
+
+    async def flush(self) -> None:
+        """
+        Hand every held group to the queue now (shutdown).
+        """
+        for key in list(self._groups):
+            self._groups[key]["timer"].cancel()
+            await self._flush(key)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "window": self.window,
+            "agents": sorted(self.agents),
+            "held": self.held,
+            "open_groups": [
+                {"agent": a, "airport": ap, "events": len(g["events"]), "age": now - g["opened"]}
+                for (a, ap), g in self._groups.items()
+            ],
+            "invocations": self.invocations,
+            "coalesced": self.coalesced,
+        }
+
+
+TASK_COALESCER = TaskCoalescer()
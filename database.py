@@ -1,3 +1,4 @@
+import asyncio
 import asyncpg
 import os
 from dotenv import load_dotenv
@@ -21,14 +22,28 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "airlines")
 incident_date = datetime.now(timezone.utc)  # ✅ ingestion time
 DSN = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
+# decisions routed together are written with one INSERT; wait this long for
+# more before flushing, and never put more than DECISION_BATCH_MAX in one statement
+DECISION_BATCH_LINGER = float(os.getenv("DECISION_BATCH_LINGER", 0.01))
+DECISION_BATCH_MAX = int(os.getenv("DECISION_BATCH_MAX", 500))
+
 # Use a pool for production
 _pool = None
 
 
+async def _init_connection(conn):
+    # JSONB <-> Python objects: callers pass dicts/lists, no json.dumps per value
+    await conn.set_type_codec(
+        "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+    )
+
+
 async def get_pool():
     global _pool
     if _pool is None:
-        _pool = await asyncpg.create_pool(dsn=DSN, min_size=1, max_size=10)
+        _pool = await asyncpg.create_pool(
+            dsn=DSN, min_size=1, max_size=10, init=_init_connection
+        )
     return _pool
 
 
@@ -52,17 +67,130 @@ async def init_db():
         );
     """
         )
+        await conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS public.upload_jobs (
+            id TEXT PRIMARY KEY,
+            filename TEXT,
+            stage VARCHAR(20) NOT NULL DEFAULT 'queued',
+            events JSONB NOT NULL DEFAULT '[]',
+            routing JSONB NOT NULL DEFAULT '[]',
+            error TEXT,
+            owner TEXT,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            updated_at TIMESTAMPTZ DEFAULT now(),
+            finished_at TIMESTAMPTZ
+        );
+    """
+        )
+        # routing rules: NULL/empty event_types, severities or keywords match
+        # anything; bump updated_at on edits so running apps hot-reload them
+        await conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS public.routing_rules (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            event_types JSONB,
+            severities JSONB,
+            keywords JSONB,
+            agents JSONB NOT NULL,
+            priority INT NOT NULL DEFAULT 0,
+            enabled BOOLEAN NOT NULL DEFAULT true,
+            updated_at TIMESTAMPTZ DEFAULT now()
+        );
+    """
+        )
+        # one row per (decision, agent) ever handed to the task queue; the
+        # primary key makes the upload path and every poller claim each pair once
+        await conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS public.agent_dispatches (
+            decision_id INT NOT NULL,
+            agent TEXT NOT NULL,
+            claimed_by TEXT,
+            claimed_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (decision_id, agent)
+        );
+    """
+        )
+        # durable agent task queue (TASK_QUEUE_BACKEND=postgres); a claimed
+        # task becomes visible again when its lease (visible_at) runs out
+        await conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS public.agent_tasks (
+            id BIGSERIAL PRIMARY KEY,
+            agent TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            priority INT NOT NULL DEFAULT 0,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            attempts INT NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            enqueued_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            visible_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_agent_tasks_visible
+            ON public.agent_tasks (visible_at);
+        -- (agent, airport) group of a coalesced task; see coalescer.py
+        ALTER TABLE public.agent_tasks ADD COLUMN IF NOT EXISTS coalesce_key TEXT;
+        CREATE INDEX IF NOT EXISTS idx_agent_tasks_coalesce
+            ON public.agent_tasks (coalesce_key) WHERE coalesce_key IS NOT NULL;
+    """
+        )
+        # agent tasks that failed permanently or ran out of retries
+        await conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS public.dead_letters (
+            id BIGSERIAL PRIMARY KEY,
+            agent TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            error TEXT,
+            attempts INT NOT NULL DEFAULT 1,
+            created_at TIMESTAMPTZ DEFAULT now()
+        );
+    """
+        )
+        # seed the unambiguous single-type cases on a fresh table; only high and
+        # critical events, since the LLM sends lower severities to monitoring
+        await conn.execute(
+            """
+        INSERT INTO public.routing_rules (name, event_types, severities, agents)
+        SELECT * FROM (VALUES
+            ('weather', '["weather"]'::jsonb, '["high", "critical"]'::jsonb, '["weather_agent"]'::jsonb),
+            ('threat', '["threat"]'::jsonb, '["high", "critical"]'::jsonb, '["bomb_threat_agent"]'::jsonb),
+            ('crew', '["crew"]'::jsonb, '["high", "critical"]'::jsonb, '["crew_agent"]'::jsonb)
+        ) AS seed
+        WHERE NOT EXISTS (SELECT 1 FROM public.routing_rules);
+    """
+        )
+        # tables seeded before the severity restriction
+        await conn.execute(
+            """
+        UPDATE public.routing_rules
+        SET severities = '["high", "critical"]'::jsonb, updated_at = now()
+        WHERE (name, event_types, agents) IN (
+            ('weather', '["weather"]'::jsonb, '["weather_agent"]'::jsonb),
+            ('threat', '["threat"]'::jsonb, '["bomb_threat_agent"]'::jsonb),
+            ('crew', '["crew"]'::jsonb, '["crew_agent"]'::jsonb)
+        )
+          AND severities IS NULL
+          AND keywords IS NULL;
+    """
+        )
 
 
-async def insert_master_decision(
-    event_id: str, event_json: dict, selected_agents: list, reason: str
-):
-    pool = await get_pool()
+def _severity_of(event_json: dict):
     severity = event_json.get("severity", None)  # Extract severity from JSON
     if isinstance(severity, list):
         severity = (
             severity[0] if severity else None
         )  # or ", ".join(severity) if you want all
+    return severity
+
+
+async def insert_master_decision(
+    event_id: str, event_json: dict, selected_agents: list, reason: str
+):
+    pool = await get_pool()
     async with pool.acquire() as conn:
         row = await conn.fetchrow(
             """
@@ -71,24 +199,339 @@ async def insert_master_decision(
             RETURNING id, created_at, incident_date;
             """,
             event_id,
-            json.dumps(event_json),
-            json.dumps(selected_agents),
+            event_json,
+            selected_agents,
             reason,
-            severity,
+            _severity_of(event_json),
             incident_date,
         )
         return dict(row)
 
 
-async def fetch_pending_decisions(limit: int = 50):
+async def insert_master_decisions(decisions: list) -> list:
+    """
+    Insert many decisions in one statement. Each item has the keyword
+    arguments of insert_master_decision; rows are returned in input order.
+    """
+    if not decisions:
+        return []
+    payload = [
+        {
+            "event_id": d["event_id"],
+            "event_json": d["event_json"],
+            "selected_agents": d["selected_agents"],
+            "reason": d["reason"],
+            "severity": _severity_of(d["event_json"]),
+        }
+        for d in decisions
+    ]
     pool = await get_pool()
     async with pool.acquire() as conn:
         rows = await conn.fetch(
             """
-            SELECT id, event_id, event_json, selected_agents, reason
+            INSERT INTO master_decision_table (event_id, event_json, selected_agents, reason, severity, incident_date)
+            SELECT d->>'event_id', d->'event_json', d->'selected_agents', d->>'reason', d->>'severity', $2
+            FROM jsonb_array_elements($1::jsonb) WITH ORDINALITY AS t(d, ord)
+            ORDER BY ord
+            RETURNING id, created_at, incident_date;
+            """,
+            payload,
+            incident_date,
+        )
+    # SERIAL ids are drawn in the ORDER BY order, so id order is input order
+    return sorted((dict(r) for r in rows), key=lambda r: r["id"])
+
+
+class DecisionBatchWriter:
+    """
+    Coalesces insert_master_decision calls made within DECISION_BATCH_LINGER
+    seconds (e.g. all events of one routing batch) into one multi-row INSERT.
+    """
+
+    def __init__(
+        self, linger: float = DECISION_BATCH_LINGER, max_batch: int = DECISION_BATCH_MAX
+    ):
+        self.linger = linger
+        self.max_batch = max_batch
+        self._pending = []  # (decision kwargs, future)
+        self._timer = None
+        self._tasks = set()  # in-flight batches
+
+    async def insert(
+        self, event_id: str, event_json: dict, selected_agents: list, reason: str
+    ) -> dict:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append(
+            (
+                {
+                    "event_id": event_id,
+                    "event_json": event_json,
+                    "selected_agents": list(selected_agents),
+                    "reason": reason,
+                },
+                fut,
+            )
+        )
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            # the event loop only holds weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch):
+        try:
+            rows = await insert_master_decisions([d for d, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), row in zip(batch, rows):
+            if not fut.done():
+                fut.set_result(row)
+
+
+decision_writer = DecisionBatchWriter()
+
+
+async def create_upload_job(job_id: str, filename: str, owner: str):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO upload_jobs (id, filename, owner) VALUES ($1, $2, $3)",
+            job_id,
+            filename,
+            owner,
+        )
+
+
+async def update_upload_job(
+    job_id: str,
+    stage: str = None,
+    events: list = None,
+    routing: list = None,
+    error: str = None,
+    finished: bool = False,
+):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """
+            UPDATE upload_jobs SET
+                stage = COALESCE($2, stage),
+                events = COALESCE($3::jsonb, events),
+                routing = COALESCE($4::jsonb, routing),
+                error = COALESCE($5, error),
+                finished_at = CASE WHEN $6 THEN now() ELSE finished_at END,
+                updated_at = now()
+            WHERE id = $1
+            """,
+            job_id,
+            stage,
+            events,
+            routing,
+            error,
+            finished,
+        )
+
+
+async def fetch_upload_job(job_id: str):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """
+            SELECT id, filename, stage, events, routing, error,
+                   created_at, updated_at, finished_at
+            FROM upload_jobs WHERE id = $1
+            """,
+            job_id,
+        )
+        return dict(row) if row else None
+
+
+async def fail_interrupted_jobs(owner: str) -> int:
+    """
+    Jobs this host was running when it stopped cannot resume (the PDF is not
+    kept); mark them failed so pollers see a final state.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        result = await conn.execute(
+            """
+            UPDATE upload_jobs
+            SET stage = 'failed', error = 'interrupted by server restart',
+                finished_at = now(), updated_at = now()
+            WHERE owner = $1 AND stage NOT IN ('completed', 'failed')
+            """,
+            owner,
+        )
+        return int(result.split()[-1])
+
+
+async def claim_pending_decisions(limit: int = 50):
+    """
+    Move up to `limit` pending decisions to 'processing' and return them.
+    SKIP LOCKED lets several pollers run without claiming the same rows.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE master_decision_table SET status = 'processing'
+            WHERE id IN (
+                SELECT id FROM master_decision_table
+                WHERE status = 'pending'
+                ORDER BY created_at ASC
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, event_id, event_json, selected_agents, reason, created_at
+            """,
+            limit,
+        )
+        return [dict(r) for r in sorted(rows, key=lambda r: r["created_at"])]
+
+
+async def claim_agent_dispatches(decision_id: int, agents: list, owner: str) -> list:
+    """
+    Claim (decision_id, agent) pairs for dispatch and mark the decision
+    processed. Returns the agents this caller won; pairs already claimed by
+    anyone (this or another process) are left out.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            WITH claimed AS (
+                INSERT INTO agent_dispatches (decision_id, agent, claimed_by)
+                SELECT $1, agent, $3 FROM unnest($2::text[]) AS agent
+                ON CONFLICT DO NOTHING
+                RETURNING agent
+            ), processed AS (
+                UPDATE master_decision_table
+                SET status = 'processed', processed_at = now()
+                WHERE id = $1 AND status IN ('pending', 'processing')
+            )
+            SELECT agent FROM claimed
+            """,
+            decision_id,
+            list(agents),
+            owner,
+        )
+        return [r["agent"] for r in rows]
+
+
+async def claim_and_enqueue_agent_tasks(
+    decision_id: int,
+    agents: list,
+    names: list,
+    priorities: list,
+    payload: dict,
+    owner: str,
+    coalesce_keys: list = None,
+    delays: list = None,
+) -> list:
+    """
+    claim_agent_dispatches and the agent_tasks insert in one statement, so a
+    pair is never claimed without its task. agents are the decision's agent
+    keys, names the matching agent function names and priorities their
+    queue priority (None = claimed but shed, no task). A task with a
+    coalesce key stays invisible for its delay (seconds) to gather its group.
+    """
+    coalesce_keys = coalesce_keys or [None] * len(agents)
+    delays = delays or [0.0] * len(agents)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            WITH wanted AS (
+                SELECT * FROM unnest($2::text[], $3::text[], $4::int[], $7::text[], $8::float8[])
+                    AS t(agent, name, priority, coalesce_key, delay)
+            ), claimed AS (
+                INSERT INTO agent_dispatches (decision_id, agent, claimed_by)
+                SELECT $1, agent, $6 FROM wanted
+                ON CONFLICT DO NOTHING
+                RETURNING agent
+            ), queued AS (
+                INSERT INTO agent_tasks (agent, payload, priority, coalesce_key, visible_at)
+                SELECT w.name, $5::jsonb, w.priority, w.coalesce_key,
+                       now() + make_interval(secs => w.delay)
+                FROM claimed c JOIN wanted w USING (agent)
+                WHERE w.priority IS NOT NULL
+            ), processed AS (
+                UPDATE master_decision_table
+                SET status = 'processed', processed_at = now()
+                WHERE id = $1 AND status IN ('pending', 'processing')
+            )
+            SELECT agent FROM claimed
+            """,
+            decision_id,
+            list(agents),
+            list(names),
+            list(priorities),
+            payload,
+            owner,
+            list(coalesce_keys),
+            list(delays),
+        )
+        return [r["agent"] for r in rows]
+
+
+async def release_agent_dispatches(decision_id: int, agents: list) -> None:
+    """
+    Undo claims whose tasks never reached the queue, so they can be dispatched again.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "DELETE FROM agent_dispatches WHERE decision_id = $1 AND agent = ANY($2::text[])",
+            decision_id,
+            list(agents),
+        )
+        await conn.execute(
+            """
+            UPDATE master_decision_table SET status = 'pending'
+            WHERE id = $1 AND status = 'processed'
+            """,
+            decision_id,
+        )
+
+
+async def fetch_recent_decisions(hours: float):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT id, event_id, event_json, selected_agents, created_at
             FROM master_decision_table
-            WHERE status = 'pending'
+            WHERE created_at >= now() - make_interval(secs => $1)
             ORDER BY created_at ASC
+            """,
+            hours * 3600,
+        )
+        return [dict(r) for r in rows]
+
+
+async def fetch_decision_history(limit: int) -> list:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT event_json, selected_agents, reason
+            FROM master_decision_table
+            ORDER BY id DESC
             LIMIT $1
             """,
             limit,
@@ -96,13 +539,205 @@ async def fetch_pending_decisions(limit: int = 50):
         return [dict(r) for r in rows]
 
 
-async def mark_decision_processing(decision_id: int):
+async def fetch_routing_rules() -> list:
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            "UPDATE master_decision_table SET status='processing' WHERE id=$1",
-            decision_id,
+        rows = await conn.fetch(
+            """
+            SELECT id, name, event_types, severities, keywords, agents, priority
+            FROM routing_rules
+            WHERE enabled
+            ORDER BY priority DESC, id ASC
+            """
+        )
+        return [dict(r) for r in rows]
+
+
+async def fetch_routing_rules_version():
+    """
+    Cheap change marker for the rules table (row count, latest updated_at).
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            "SELECT count(*) AS n, max(updated_at) AS updated FROM routing_rules"
+        )
+        return row["n"], row["updated"]
+
+
+async def enqueue_agent_task(agent: str, payload: dict, priority: int) -> int:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            """
+            INSERT INTO agent_tasks (agent, payload, priority)
+            VALUES ($1, $2::jsonb, $3)
+            RETURNING id
+            """,
+            agent,
+            payload,
+            priority,
+        )
+
+
+async def claim_agent_tasks(
+    agents: list, agent_limits: list, limit: int, owner: str, visibility: float, aging: float
+) -> list:
+    """
+    Claim up to `limit` visible tasks, at most agent_limits[i] for agents[i],
+    most urgent first (priority minus one level per `aging` seconds waited).
+    Claimed rows are hidden from other consumers for `visibility` seconds.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE agent_tasks
+            SET status = 'running', claimed_by = $4, attempts = attempts + 1,
+                visible_at = now() + make_interval(secs => $5)
+            WHERE id IN (
+                SELECT t.id
+                FROM unnest($1::text[], $2::int[]) AS a(agent, n)
+                CROSS JOIN LATERAL (
+                    SELECT id, priority - extract(epoch FROM now() - enqueued_at) / $6 AS urgency
+                    FROM agent_tasks
+                    WHERE agent = a.agent AND visible_at <= now()
+                    ORDER BY urgency, id
+                    LIMIT a.n
+                    FOR UPDATE SKIP LOCKED
+                ) t
+                ORDER BY t.urgency, t.id
+                LIMIT $3
+            )
+            RETURNING id, agent, payload, priority, attempts, enqueued_at, coalesce_key
+            """,
+            list(agents),
+            list(agent_limits),
+            limit,
+            owner,
+            visibility,
+            aging,
+        )
+        return [dict(r) for r in rows]
+
+
+async def claim_coalesced_tasks(keys: list, owner: str, visibility: float) -> list:
+    """
+    Claim the not yet visible (or expired) tasks of the given coalesce groups,
+    to be run together with the group's task that was just claimed.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            UPDATE agent_tasks
+            SET status = 'running', claimed_by = $2, attempts = attempts + 1,
+                visible_at = now() + make_interval(secs => $3)
+            WHERE id IN (
+                SELECT id FROM agent_tasks
+                WHERE coalesce_key = ANY($1::text[])
+                  AND (status = 'queued' OR visible_at <= now())
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, payload, coalesce_key
+            """,
+            list(keys),
+            owner,
+            visibility,
+        )
+        return [dict(r) for r in sorted(rows, key=lambda r: r["id"])]
+
+
+async def complete_agent_tasks(task_ids: list):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("DELETE FROM agent_tasks WHERE id = ANY($1::bigint[])", list(task_ids))
+
+
+async def agent_task_counts() -> dict:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT agent, status, count(*) AS n,
+                   extract(epoch FROM now() - min(enqueued_at)) AS oldest_age
+            FROM agent_tasks
+            GROUP BY agent, status
+            """
+        )
+        counts = {}
+        for r in rows:
+            counts.setdefault(r["agent"], {})[r["status"]] = {
+                "count": r["n"],
+                "oldest_age": float(r["oldest_age"] or 0),
+            }
+        return counts
+
+
+async def insert_dead_letter(agent: str, payload: dict, error: str, attempts: int) -> int:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval(
+            """
+            INSERT INTO dead_letters (agent, payload, error, attempts)
+            VALUES ($1, $2::jsonb, $3, $4)
+            RETURNING id
+            """,
+            agent,
+            payload,
+            error,
+            attempts,
+        )
+
+
+async def fetch_dead_letters(agent: str = None, limit: int = 100) -> list:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT id, agent, payload, error, attempts, created_at
+            FROM dead_letters
+            WHERE $1::text IS NULL OR agent = $1
+            ORDER BY id ASC
+            LIMIT $2
+            """,
+            agent,
+            limit,
         )
+        return [dict(r) for r in rows]
+
+
+async def take_dead_letters(agents: list, ids: list = None, limit: int = 100, handle=None) -> tuple:
+    """
+    Re-drive up to `limit` of the oldest dead letters for the given agents
+    (optionally only the given ids). `handle(row)` is awaited for each row
+    while it is locked; only rows it accepts (returns True) are deleted.
+    Returns (accepted ids, refused ids).
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            rows = await conn.fetch(
+                """
+                SELECT id, agent, payload FROM dead_letters
+                WHERE agent = ANY($1::text[])
+                  AND ($2::bigint[] IS NULL OR id = ANY($2))
+                ORDER BY id ASC
+                LIMIT $3
+                FOR UPDATE SKIP LOCKED
+                """,
+                agents,
+                ids,
+                limit,
+            )
+            accepted, refused = [], []
+            for row in rows:
+                (accepted if await handle(dict(row)) else refused).append(row["id"])
+            await conn.execute(
+                "DELETE FROM dead_letters WHERE id = ANY($1::bigint[])", accepted
+            )
+            return accepted, refused
 
 
 async def mark_decision_processed(decision_id: int, success: bool = True):
@@ -1,10 +1,7 @@
 import asyncio
-from task_queue import TASK_QUEUE
-from database import (
-    fetch_pending_decisions,
-    mark_decision_processing,
-    mark_decision_processed,
-)
+from task_queue import TASK_QUEUE, TASK_OWNER, PostgresTaskQueue, register_agents
+from coalescer import TASK_COALESCER
+from database import claim_pending_decisions, claim_agent_dispatches, release_agent_dispatches
 from agents.weather_agent import weather_agent
 from agents.monitoring import monitoring_agent
 from agents.bomb_threat_agent import bomb_threat_agent
@@ -18,16 +15,77 @@ AGENT_MAP = {
     "bomb_threat_agent": bomb_threat_agent,
 }
 
+# tasks read back from the durable queue are resolved by agent name
+register_agents(AGENT_MAP)
+
 POLL_INTERVAL = 3.0
 
+# identifies this process in agent_dispatches.claimed_by
+DISPATCH_OWNER = TASK_OWNER
+
+DISPATCH_STATS = {"enqueued": 0, "suppressed_duplicates": 0, "unknown_agents": 0}
+
+
+async def dispatch_decision(decision_id: int, selected_agents: list, event_data: dict) -> list:
+    """
+    Enqueue the agents of one decision, exactly once per (decision, agent)
+    across the upload path, the poller and other processes. Returns the
+    agents this call enqueued.
+
+    With the postgres backend the claim and the task row are written in one
+    statement. Otherwise a claim whose task could not be queued is released
+    and the decision goes back to pending for the poller.
+    """
+    agents = []
+    for agent in dict.fromkeys(selected_agents):
+        if agent not in AGENT_MAP:
+            print(f"[decision_worker] unknown agent {agent} for decision {decision_id}")
+            DISPATCH_STATS["unknown_agents"] += 1
+            continue
+        agents.append(agent)
+
+    if isinstance(TASK_QUEUE, PostgresTaskQueue):
+        # coalescing groups are gathered in agent_tasks, not in memory
+        claimed = await TASK_QUEUE.put_claimed(
+            decision_id,
+            [(a, AGENT_MAP[a]) for a in agents],
+            event_data,
+            DISPATCH_OWNER,
+            [TASK_COALESCER.durable_group((AGENT_MAP[a], event_data)) for a in agents],
+        )
+    else:
+        claimed = await claim_agent_dispatches(decision_id, agents, DISPATCH_OWNER)
+    suppressed = len(agents) - len(claimed)
+    if suppressed:
+        DISPATCH_STATS["suppressed_duplicates"] += suppressed
+        print(f"[decision_worker] decision {decision_id}: {suppressed} agents already dispatched")
+
+    if not isinstance(TASK_QUEUE, PostgresTaskQueue):
+        enqueued = []
+        try:
+            for agent in claimed:
+                # repeated work for the same airport is merged before it reaches the queue
+                await TASK_COALESCER.put((AGENT_MAP[agent], event_data))
+                enqueued.append(agent)
+        except BaseException:
+            lost = [a for a in claimed if a not in enqueued]
+            print(f"[decision_worker] decision {decision_id}: releasing {lost} after failed enqueue")
+            await asyncio.shield(release_agent_dispatches(decision_id, lost))
+            raise
+    DISPATCH_STATS["enqueued"] += len(claimed)
+    return claimed
+
+
+def dispatch_stats() -> dict:
+    return {"owner": DISPATCH_OWNER, **DISPATCH_STATS}
+
 
 async def decision_poller():
     while True:
-        decisions = await fetch_pending_decisions()
+        decisions = await claim_pending_decisions()
 
         for decision in decisions:
             decision_id = decision["id"]
-            await mark_decision_processing(decision_id)
 
             selected_agents = decision["selected_agents"]
             if isinstance(selected_agents, str):
@@ -37,15 +95,6 @@ async def decision_poller():
             if isinstance(event_data, str):
                 event_data = json.loads(event_data)
 
-            for agent in selected_agents:
-                if agent not in AGENT_MAP:
-                    print(
-                        f"[decision_poller] unknown agent {agent} for decision {decision_id}"
-                    )
-                    continue
-
-                await TASK_QUEUE.put((AGENT_MAP[agent], event_data))
-
-            await mark_decision_processed(decision_id)
+            await dispatch_decision(decision_id, selected_agents, event_data)
 
         await asyncio.sleep(POLL_INTERVAL)
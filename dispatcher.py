@@ -0,0 +1,147 @@
+# dispatcher.py
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+
+import httpx
+
+DISRUPTION_SERVICE_URL = os.getenv("DISRUPTION_SERVICE_URL", "http://localhost:5000")
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", 4))
+DISPATCH_OUTBOX_SIZE = int(os.getenv("DISPATCH_OUTBOX_SIZE", 1000))
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", 4))
+DISPATCH_TIMEOUT = float(os.getenv("DISPATCH_TIMEOUT", 5))
+DISPATCH_BACKOFF_BASE = float(os.getenv("DISPATCH_BACKOFF_BASE", 0.5))
+DISPATCH_BACKOFF_MAX = float(os.getenv("DISPATCH_BACKOFF_MAX", 10))
+# how many dispatch statuses are kept for GET /dispatch/{id}
+DISPATCH_STATUS_HISTORY = int(os.getenv("DISPATCH_STATUS_HISTORY", 5000))
+
+
+class DisruptionDispatcher:
+    """
+    Background sender for POST /disruption/city. submit() only records the
+    dispatch and puts it in a bounded outbox; worker tasks send it over a
+    shared keep-alive client and retry transient failures with backoff.
+    """
+
+    def __init__(self, base_url: str = DISRUPTION_SERVICE_URL):
+        self.base_url = base_url
+        self._outbox = asyncio.Queue(maxsize=DISPATCH_OUTBOX_SIZE)
+        self._status = OrderedDict()
+        self._client = None
+        self._workers = []
+
+    async def start(self, workers: int = DISPATCH_WORKERS):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=DISPATCH_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=workers, max_keepalive_connections=workers
+            ),
+        )
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(workers)
+        ]
+        print(f"[dispatcher] started {workers} workers -> {self.base_url}")
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _record(self, dispatch_id: str, **fields):
+        entry = self._status.setdefault(dispatch_id, {"id": dispatch_id})
+        entry.update(fields, updated_at=time.time())
+        while len(self._status) > DISPATCH_STATUS_HISTORY:
+            self._status.popitem(last=False)
+
+    def submit(self, payload: dict, path: str = "/disruption/city") -> str:
+        """
+        Queue a dispatch and return its id without waiting for delivery.
+        When the outbox is full the dispatch is recorded as "dropped".
+        """
+        dispatch_id = uuid.uuid4().hex
+        self._record(
+            dispatch_id,
+            path=path,
+            payload=payload,
+            status="queued",
+            attempts=0,
+            created_at=time.time(),
+        )
+        try:
+            self._outbox.put_nowait((dispatch_id, path, payload))
+        except asyncio.QueueFull:
+            self._record(dispatch_id, status="dropped", error="outbox full")
+            print(f"[dispatcher] outbox full, dropped {dispatch_id}")
+        return dispatch_id
+
+    async def _worker(self, n: int):
+        while True:
+            dispatch_id, path, payload = await self._outbox.get()
+            try:
+                await self._send(dispatch_id, path, payload)
+            except Exception as e:
+                self._record(dispatch_id, status="failed", error=str(e))
+            finally:
+                self._outbox.task_done()
+
+    async def _send(self, dispatch_id: str, path: str, payload: dict):
+        for attempt in range(1, DISPATCH_MAX_ATTEMPTS + 1):
+            self._record(dispatch_id, status="sending", attempts=attempt)
+            try:
+                response = await self._client.post(path, json=payload)
+            except httpx.HTTPError as e:
+                error, retry = str(e) or type(e).__name__, True
+            else:
+                if response.status_code < 400:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = response.text
+                    self._record(
+                        dispatch_id,
+                        status="delivered",
+                        http_status=response.status_code,
+                        response=body,
+                        error=None,
+                    )
+                    print(f"[dispatcher] {dispatch_id} delivered: {response.status_code}")
+                    return
+                error = f"HTTP {response.status_code}"
+                # client errors will not succeed on retry
+                retry = response.status_code >= 500 or response.status_code == 429
+                self._record(dispatch_id, http_status=response.status_code)
+
+            self._record(dispatch_id, error=error)
+            if not retry or attempt == DISPATCH_MAX_ATTEMPTS:
+                break
+            delay = min(DISPATCH_BACKOFF_MAX, DISPATCH_BACKOFF_BASE * 2 ** (attempt - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        self._record(dispatch_id, status="failed")
+        print(f"[dispatcher] {dispatch_id} failed: {error}")
+
+    def status(self, dispatch_id: str):
+        entry = self._status.get(dispatch_id)
+        return dict(entry) if entry else None
+
+    def stats(self) -> dict:
+        counts = {}
+        for entry in self._status.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "outbox_depth": self._outbox.qsize(),
+            "outbox_capacity": self._outbox.maxsize,
+            "workers": len(self._workers),
+            "by_status": counts,
+        }
+
+
+DISPATCHER = DisruptionDispatcher()
@@ -0,0 +1,31 @@
+# event_fields.py
+from datetime import datetime
+from typing import Optional
+
+# start_time / end_time format of parsed events
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+
+def as_list(val) -> list:
+    """
+    Parsed events carry most fields as lists; accept a scalar too.
+    """
+    if val is None:
+        return []
+    return val if isinstance(val, list) else [val]
+
+
+def parse_time(val) -> Optional[datetime]:
+    try:
+        return datetime.strptime(str(val).strip(), TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def severity_rank(event: dict) -> int:
+    """
+    Rank of the event's highest severity; -1 when it has none.
+    """
+    severities = [str(s).strip().lower() for s in as_list(event.get("severity"))]
+    return max((SEVERITY_RANK.get(s, -1) for s in severities), default=-1)
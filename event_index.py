@@ -0,0 +1,169 @@
+# event_index.py
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from database import fetch_recent_decisions
+from event_fields import as_list, parse_time, severity_rank
+
+# how far back an already-routed event still absorbs new duplicates
+MERGE_WINDOW_HOURS = float(os.getenv("MERGE_WINDOW_HOURS", 6))
+
+
+def merge_key(event: dict) -> tuple:
+    """
+    Normalized (airports, types) signature; the time window is matched separately.
+    """
+    airports = frozenset(
+        str(a).strip().upper() for a in as_list(event.get("airport_code")) if a
+    )
+    types = frozenset(
+        str(t).strip().lower() for t in as_list(event.get("event_type")) if t
+    )
+    return airports, types
+
+
+def event_interval(event: dict) -> tuple:
+    """
+    (start, end) of the event; a missing bound is open-ended.
+    """
+    start = parse_time(event.get("start_time")) or datetime.min
+    end = parse_time(event.get("end_time")) or datetime.max
+    return start, end
+
+
+def _stated_interval(event: dict) -> Optional[tuple]:
+    """
+    (start, end) for matching: None without a start time, and a missing end
+    is taken as the start, so an event never claims an open-ended window.
+    """
+    start = parse_time(event.get("start_time"))
+    if start is None:
+        return None
+    end = parse_time(event.get("end_time")) or start
+    return start, max(start, end)
+
+
+class EventMergeIndex:
+    """
+    In-memory index of recently routed events keyed by normalized airport and
+    type. A new event whose time window overlaps an indexed one, and that is
+    not more severe, is a duplicate and reuses that decision instead of
+    triggering routing and agent runs again. An escalation is routed anew.
+    Events without a start time are never merged.
+    """
+
+    def __init__(self, window_hours: float = MERGE_WINDOW_HOURS):
+        self.window = timedelta(hours=window_hours)
+        self._entries = {}  # merge_key -> list of entries
+        self.events_seen = 0
+        self.duplicates = 0
+        self.agent_runs_saved = 0
+
+    def _prune(self, now: datetime) -> None:
+        cutoff = now - self.window
+        for key in list(self._entries):
+            alive = [e for e in self._entries[key] if e["seen_at"] >= cutoff]
+            if alive:
+                self._entries[key] = alive
+            else:
+                del self._entries[key]
+
+    def match(self, event: dict) -> Optional[dict]:
+        """
+        Return the indexed entry this event duplicates, or None.
+        """
+        now = datetime.now(timezone.utc)
+        self._prune(now)
+        self.events_seen += 1
+        key = merge_key(event)
+        interval = _stated_interval(event)
+        if not key[0] or not key[1] or interval is None:
+            return None
+        start, end = interval
+        severity = severity_rank(event)
+        for entry in self._entries.get(key, []):
+            if severity > entry["severity"]:
+                # an escalation has to reach the agents
+                continue
+            if start <= entry["end"] and entry["start"] <= end:
+                # widen the indexed window so a chain of overlapping updates collapses too
+                entry["start"] = min(entry["start"], start)
+                entry["end"] = max(entry["end"], end)
+                return entry
+        return None
+
+    def add(
+        self,
+        event: dict,
+        decision_id: Optional[int],
+        selected_agents: list,
+        seen_at: Optional[datetime] = None,
+    ) -> Optional[dict]:
+        """
+        Index an event. Pass decision_id=None to reserve the slot before the
+        event is routed, then fill in decision_id/selected_agents on the
+        returned entry (or remove() it if routing fails).
+        """
+        key = merge_key(event)
+        interval = _stated_interval(event)
+        if not key[0] or not key[1] or interval is None:
+            return None
+        start, end = interval
+        entry = {
+            "key": key,
+            "decision_id": decision_id,
+            "event_id": event.get("event_id"),
+            "selected_agents": list(selected_agents),
+            "start": start,
+            "end": end,
+            "severity": severity_rank(event),
+            "seen_at": seen_at or datetime.now(timezone.utc),
+            "ready": None,
+        }
+        self._entries.setdefault(key, []).append(entry)
+        return entry
+
+    def remove(self, entry: dict) -> None:
+        entries = self._entries.get(entry["key"], [])
+        if entry in entries:
+            entries.remove(entry)
+
+    def count_saved(self, entry: dict) -> int:
+        """
+        Record the agent runs saved by collapsing a duplicate into entry.
+        """
+        saved = len(set(entry["selected_agents"]) | {"monitoring"})
+        self.duplicates += 1
+        self.agent_runs_saved += saved
+        return saved
+
+    async def load_recent(self) -> int:
+        """
+        Seed the index from decisions stored within the merge window.
+        """
+        hours = self.window.total_seconds() / 3600
+        rows = await fetch_recent_decisions(hours)
+        for row in rows:
+            event = row["event_json"]
+            if isinstance(event, str):
+                event = json.loads(event)
+            agents = row["selected_agents"]
+            if isinstance(agents, str):
+                agents = json.loads(agents)
+            self.add(event, row["id"], agents, seen_at=row["created_at"])
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "window_hours": self.window.total_seconds() / 3600,
+            "indexed_events": sum(len(v) for v in self._entries.values()),
+            "events_seen": self.events_seen,
+            "duplicates_collapsed": self.duplicates,
+            "routing_calls_saved": self.duplicates,
+            "agent_runs_saved": self.agent_runs_saved,
+        }
+
+
+EVENT_INDEX = EventMergeIndex()
@@ -0,0 +1,92 @@
+# event_stream.py
+import asyncio
+import contextvars
+import json
+import os
+import time
+
+# per-subscriber buffer; when a client falls behind the oldest messages are dropped
+SSE_SUBSCRIBER_BUFFER = int(os.getenv("SSE_SUBSCRIBER_BUFFER", 100))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+
+# id of the upload being processed; set in process_pdf and inherited by its tasks
+current_upload = contextvars.ContextVar("current_upload", default=None)
+
+
+class _Subscriber:
+    def __init__(self, upload_id: str = None, maxsize: int = SSE_SUBSCRIBER_BUFFER):
+        self.upload_id = upload_id
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message: dict):
+        if self.upload_id and message["upload_id"] != self.upload_id:
+            return
+        if self.queue.full():
+            # never block the pipeline on a slow browser: lose the oldest instead
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class EventBroker:
+    """
+    Fan-out of pipeline progress (extracted, routed, persisted, dispatched)
+    to server-sent event subscribers, each with a bounded buffer.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._seq = 0
+
+    def publish(self, kind: str, data: dict, upload_id: str = None):
+        upload_id = upload_id or current_upload.get()
+        if not self._subscribers:
+            return
+        self._seq += 1
+        message = {
+            "seq": self._seq,
+            "kind": kind,
+            "upload_id": upload_id,
+            "ts": time.time(),
+            "data": data,
+        }
+        for sub in list(self._subscribers):
+            sub.offer(message)
+
+    async def stream(self, upload_id: str = None, is_disconnected=None):
+        """
+        Async iterator of SSE-formatted strings for one subscriber.
+        """
+        sub = _Subscriber(upload_id)
+        self._subscribers.add(sub)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if is_disconnected is not None and await is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                if sub.dropped:
+                    yield f"event: dropped\ndata: {json.dumps({'count': sub.dropped})}\n\n"
+                    sub.dropped = 0
+                yield (
+                    f"id: {message['seq']}\n"
+                    f"event: {message['kind']}\n"
+                    f"data: {json.dumps(message, default=str)}\n\n"
+                )
+        finally:
+            self._subscribers.discard(sub)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "buffered": sum(s.queue.qsize() for s in self._subscribers),
+            "published": self._seq,
+        }
+
+
+EVENT_BROKER = EventBroker()
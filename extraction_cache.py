@@ -0,0 +1,143 @@
+# extraction_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.sqlite3")
+EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", 7 * 24 * 3600))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", 10000))
+# hits only note accessed_at in memory; it is written back with the next
+# set(), or once this many keys have been touched
+EXTRACTION_CACHE_TOUCH_BATCH = int(os.getenv("EXTRACTION_CACHE_TOUCH_BATCH", 64))
+
+
+def content_key(*parts) -> str:
+    """
+    sha256 over the given parts (str or bytes), separated so that
+    ("ab", "c") and ("a", "bc") hash differently.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Disk-backed (SQLite) cache of LLM extraction results keyed on a content hash.
+    Entries expire after `ttl` seconds; the least recently used entries are
+    evicted once the table grows past `max_entries`. A hit does not write:
+    access times are batched, so lookups never wait on a commit.
+    """
+
+    def __init__(
+        self,
+        path: str = EXTRACTION_CACHE_PATH,
+        ttl: float = EXTRACTION_CACHE_TTL,
+        max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}  # key -> accessed_at not yet written
+        self._lock = threading.Lock()
+        # chunks are parsed from worker threads, so share one connection under a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extraction_cache_accessed "
+            "ON extraction_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[object]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= EXTRACTION_CACHE_TOUCH_BATCH:
+                self._flush_touched()
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE extraction_cache SET accessed_at = ? WHERE key = ?",
+                [(at, key) for key, at in self._touched.items()],
+            )
+            self._touched = {}
+
+    def set(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._touched.pop(key, None)
+            # eviction is by access time, so write back the pending hits first
+            self._flush_touched()
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?", (now - self.ttl,)
+        )
+        self._conn.execute(
+            """
+            DELETE FROM extraction_cache WHERE key IN (
+                SELECT key FROM extraction_cache
+                ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_cache")
+            self._touched = {}
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM extraction_cache"
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
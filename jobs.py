@@ -0,0 +1,73 @@
+# jobs.py
+import os
+import socket
+import time
+import traceback
+import uuid
+
+from database import (
+    create_upload_job,
+    update_upload_job,
+    fail_interrupted_jobs,
+)
+
+# progress is written to Postgres at most this often while a job runs
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", 1.0))
+JOB_OWNER = os.getenv("JOB_OWNER", socket.gethostname())
+
+
+class UploadJob:
+    """
+    Tracks one background upload. Stage changes are written immediately;
+    events and routing results are flushed at most every JOB_PROGRESS_INTERVAL.
+    Stages: queued -> parsing -> routing -> completed | failed
+    """
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.events = []
+        self.routing = []
+        self._dirty = False
+        self._last_flush = 0.0
+
+    @classmethod
+    async def create(cls, filename: str) -> "UploadJob":
+        job = cls(uuid.uuid4().hex)
+        await create_upload_job(job.id, filename, JOB_OWNER)
+        return job
+
+    async def _flush(self, **fields):
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        await update_upload_job(
+            self.id, events=self.events, routing=self.routing, **fields
+        )
+
+    async def _maybe_flush(self):
+        self._dirty = True
+        if time.monotonic() - self._last_flush >= JOB_PROGRESS_INTERVAL:
+            await self._flush()
+
+    async def set_stage(self, stage: str):
+        await self._flush(stage=stage)
+
+    async def add_event(self, event: dict):
+        self.events.append(event)
+        await self._maybe_flush()
+
+    async def add_routing(self, result: dict):
+        self.routing.append(result)
+        await self._maybe_flush()
+
+    async def complete(self, routing: list):
+        # final routing list is in event order, not completion order
+        self.routing = list(routing)
+        await self._flush(stage="completed", finished=True)
+
+    async def fail(self, error: BaseException):
+        traceback.print_exception(error)
+        await self._flush(stage="failed", error=f"{type(error).__name__}: {error}", finished=True)
+
+
+async def recover_jobs() -> int:
+    return await fail_interrupted_jobs(JOB_OWNER)
@@ -1,47 +1,240 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, AsyncIterator, Optional
 import PyPDF2
 import os
+import re
 import json
+import copy
+import threading
 import openai
 import math
+import multiprocessing
+import tempfile
 import time
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import asyncio
+from collections import deque, Counter
+from io import BytesIO
 from openai import OpenAI
 from datetime import datetime
 from langsmith import traceable
+from event_fields import SEVERITY_RANK, as_list, parse_time, severity_rank
+from extraction_cache import ExtractionCache, content_key
+from pdf_extract import count_pdf_pages, extract_page_range, open_pdf
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a ~4 characters per token estimate
+    tiktoken = None
 
 load_dotenv()
 client = OpenAI()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
-today_str = datetime.now().strftime("%Y-%m-%d")
+
+
+def _today() -> str:
+    # read on every use: a long-running server crosses midnight
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+# PDF extraction is CPU-bound; it runs in a process pool, split by page range
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 2))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+# max number of uploads being extracted at the same time
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("MAX_CONCURRENT_EXTRACTIONS", 2))
+# how the pool's children are started; "forkserver" falls back to "spawn" where unsupported
+PDF_POOL_START_METHOD = os.getenv("PDF_POOL_START_METHOD", "forkserver")
+
+# bump PROMPT_VERSION whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "gpt-4")
+PROMPT_VERSION = "v2"
+
+# per-request token budget for the PDF text, and how much of the previous
+# chunk is repeated at the start of the next so boundary events stay whole
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 800))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 100))
+# chunks that need the LLM are packed into one request up to this many input
+# tokens (0 = one request per chunk)
+BATCH_TOKENS = int(os.getenv("BATCH_TOKENS", 2400))
+# completion budget per chunk; a batch gets this much per chunk and is closed
+# before it would need more than BATCH_MAX_COMPLETION_TOKENS
+CHUNK_COMPLETION_TOKENS = int(os.getenv("CHUNK_COMPLETION_TOKENS", 1200))
+BATCH_MAX_COMPLETION_TOKENS = int(os.getenv("BATCH_MAX_COMPLETION_TOKENS", 3600))
+
+EVENT_EXTRACTION_PROMPT = """
+    Return ONLY a valid JSON array of event objects. No explanations, no extra text.
+
+    Event fields:
+    - event_id (string)
+    - event_type (array of types: Weather, Threat, Crew, Traffic, MechanicalFailure, Other)
+    - severity (array of: Low, Medium, High, Critical)
+    - impact_description (array of short strings)
+    - airport_code (array of IATA codes)
+    - start_time (YYYY-MM-DD HH:MM)
+    - end_time (YYYY-MM-DD HH:MM)
+    - actions (array of suggested action strings)
+
+    TIME EXTRACTION RULES:
+    - If the text contains phrases like:
+      • "between X – Y"
+      • "from X to Y"
+      • "expected between X and Y"
+      • "from X onwards" → use X as start_time, leave end_time as empty string ""
+      • "until Y" → set end_time as Y
+    - If date is not mentioned, assume TODAY’s date: {today_str}.
+    - Preserve the local time exactly as written.
+    - Both start_time and end_time MUST be populated or empty string "".
+    - NEVER use the word "Unknown".
+
+    OTHER RULES:
+    - airport_code must be valid IATA codes.
+    - severity must reflect wording (e.g., "low-visibility" → Medium or High depending on context).
+    - impact_description must be short factual phrases.
+    - actions must be realistic airline operational actions.
+    - Ensure perfectly valid JSON (double quotes, no trailing commas).
+    """
+
+_process_pool = None
+extraction_cache = ExtractionCache()
+_extract_semaphore = asyncio.Semaphore(MAX_CONCURRENT_EXTRACTIONS)
 
 
 # --------------- PDF extraction ---------------
-def extract_text_from_pdf(file_obj) -> str:
+def iter_pdf_pages(file_obj) -> Iterator[str]:
     """
-    Accepts a file-like object (opened in binary) and returns extracted text.
+    Yield the extracted text of each page, one page at a time.
+    Pages that fail to extract or are empty are skipped.
     """
     reader = PyPDF2.PdfReader(file_obj)
-    text = ""
     for page in reader.pages:
         try:
             page_text = page.extract_text()
         except Exception:
             page_text = ""
         if page_text:
-            text += page_text + "\n"
-    return text.strip()
+            yield page_text
+
+
+def extract_text_from_pdf(file_obj) -> str:
+    """
+    Accepts a file-like object (opened in binary) and returns extracted text.
+    """
+    return "\n".join(iter_pdf_pages(file_obj)).strip()
+
+
+def _pool_context():
+    method = PDF_POOL_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = "spawn"
+    return multiprocessing.get_context(method)
+
+
+def start_process_pool() -> ProcessPoolExecutor:
+    """
+    Create the PDF extraction pool. Call it at startup: the children come
+    from a forkserver (or spawn), never from forking a process that already
+    runs threads.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PDF_EXTRACT_WORKERS, mp_context=_pool_context()
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """
+    Stop the PDF extraction pool (blocking; run it in a thread from async code).
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+def _spool_pdf(data: bytes) -> str:
+    fd, path = tempfile.mkstemp(prefix="pdf_", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _pdf_digest(pdf, *parts) -> str:
+    """
+    content_key(*parts, <pdf content>); same key for the bytes and the file.
+    """
+    if isinstance(pdf, (bytes, bytearray)):
+        return content_key(*parts, pdf)
+    with open_pdf(pdf) as f:
+        return content_key(*parts, f.read() if isinstance(f, BytesIO) else f)
+
+
+async def aiter_pdf_pages(pdf) -> AsyncIterator[str]:
+    """
+    Extract page text in the process pool, one task per PDF_PAGES_PER_TASK
+    pages, and yield pages in document order as their range finishes.
+    At most MAX_CONCURRENT_EXTRACTIONS uploads hold the pool at once.
+    pdf is the PDF bytes or the path of a PDF file; bytes are written to a
+    temp file once, so the pool receives the path instead of a copy per range.
+    """
+    loop = asyncio.get_running_loop()
+    pool = start_process_pool()
+    spooled = None
+
+    def _release(fut):
+        if not fut.cancelled():
+            fut.exception()  # mark as retrieved; errors surface below
+        if spooled is not None:
+            os.unlink(spooled)
+        _extract_semaphore.release()
+
+    await _extract_semaphore.acquire()
+    try:
+        if isinstance(pdf, (bytes, bytearray)):
+            pdf = spooled = await asyncio.to_thread(_spool_pdf, pdf)
+        n_pages = await loop.run_in_executor(pool, count_pdf_pages, pdf)
+        futures = [
+            loop.run_in_executor(
+                pool,
+                extract_page_range,
+                pdf,
+                start,
+                min(start + PDF_PAGES_PER_TASK, n_pages),
+            )
+            for start in range(0, n_pages, PDF_PAGES_PER_TASK)
+        ]
+    except BaseException:
+        if spooled is not None:
+            os.unlink(spooled)
+        _extract_semaphore.release()
+        raise
+    # the slot is freed (and the spooled copy removed) once every range is
+    # done, even if the caller stops early
+    asyncio.gather(*futures).add_done_callback(_release)
+
+    for fut in futures:
+        for page_text in await fut:
+            yield page_text
+
+
+async def extract_text_from_pdf_async(pdf) -> str:
+    """
+    Process-pool version of extract_text_from_pdf; safe to await from the event loop.
+    """
+    return "\n".join([p async for p in aiter_pdf_pages(pdf)]).strip()
 
 
 # --------------- helper to call OpenAI safely ---------------
-@traceable(name="get_agent_details")
-def _call_openai(prompt: str, max_tokens: int = 1000) -> str:
-    # synchronous call; we'll call via to_thread from async code if needed
-    response = client.chat.completions.create(
-        model="gpt-4",
+@traceable(name="stream_event_extraction")
+def _stream_openai(prompt: str, max_tokens: int = 1000, status: dict = None) -> Iterator[str]:
+    """
+    Extraction request; yields the completion text as it streams in.
+    The finish reason ("length" when cut off at max_tokens) is stored in status.
+    """
+    stream = client.chat.completions.create(
+        model=EXTRACTION_MODEL,
         messages=[
             {
                 "role": "system",
@@ -51,126 +244,794 @@ def _call_openai(prompt: str, max_tokens: int = 1000) -> str:
         ],
         temperature=0,
         max_tokens=max_tokens,
+        stream=True,
     )
-    return response.choices[0].message.content.strip()
+    for part in stream:
+        if not part.choices:
+            continue
+        if part.choices[0].finish_reason and status is not None:
+            status["finish_reason"] = part.choices[0].finish_reason
+        if part.choices[0].delta.content:
+            yield part.choices[0].delta.content
+
+
+class EventStreamDecoder:
+    """
+    Incremental decoder for a streamed JSON array of event objects.
+    feed() returns every event whose closing brace has arrived; a truncated
+    tail only loses the last, still-open object. A bare top-level object
+    (no array) is treated as a single event, and text before the first
+    '[' or '{' (e.g. a code fence) is ignored, as is anything after the array
+    closes.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._event_depth = 1
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._obj = None  # chars of the event object being read
+        self._done = False
+
+    def feed(self, text: str) -> List[Dict]:
+        out = []
+        for ch in text:
+            if self._done:
+                break
+            if self._root is None:
+                if ch not in "[{":
+                    continue
+                self._root = ch
+                self._event_depth = 1 if ch == "[" else 0
+            if self._in_str:
+                if self._obj is not None:
+                    self._obj.append(ch)
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch in "[{":
+                if ch == "{" and self._obj is None and self._depth == self._event_depth:
+                    self._obj = []
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                self._done = self._root == "[" and self._depth == 0
+            if self._obj is not None:
+                self._obj.append(ch)
+                if ch == "}" and self._depth == self._event_depth:
+                    raw, self._obj = "".join(self._obj), None
+                    try:
+                        out.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        pass
+        return out
+
+
+# --------------- deterministic fast path ---------------
+# Keyword rules mirroring the extraction prompt. A chunk only takes the fast path
+# when every block in it is either boilerplate or a fully specified event.
+EVENT_TYPE_KEYWORDS = {
+    "Weather": r"weather|fog|storm|thunderstorm|wind(?!ow)|crosswind|visibility|snow|rain|cyclone|metar|sigmet",
+    "Threat": r"bomb|threat|security alert|security incident|evacuat",
+    "Crew": r"crew|duty time|rest period",
+    "Traffic": r"runway clos|taxiway|atc|congestion|flow control|capacity",
+    "MechanicalFailure": r"mechanical|technical fault|engine|hydraulic|mel\b|cdl\b|aog\b",
+}
+_TYPE_RES = {t: re.compile(rf"\b(?:{kw})", re.I) for t, kw in EVENT_TYPE_KEYWORDS.items()}
+
+DEFAULT_ACTIONS = {
+    "Weather": ["Monitor weather updates", "Prepare for delays and diversions"],
+    "Threat": ["Coordinate with airport security", "Hold departures pending clearance"],
+    "Crew": ["Arrange standby crew", "Review crew duty limits"],
+    "Traffic": ["Coordinate slot revisions with ATC", "Adjust departure schedule"],
+    "MechanicalFailure": ["Dispatch maintenance team", "Arrange replacement aircraft"],
+}
+
+# three-letter words that look like IATA codes in bulletins but are not airports
+_NOT_IATA = {"ATC", "UTC", "LOW", "THE", "AND", "FOR", "MEL", "CDL", "AOG", "ETA", "ETD", "HRS", "IST"}
+_IATA_RE = re.compile(
+    r"(?:\b(?:airport|station|stn|at|@)\s*[:\-]?\s*|\()([A-Z]{3})\b\)?"
+)
+_SEVERITY_RE = re.compile(
+    r"\bseverity\s*(?:level)?\s*[:\-]?\s*(low|medium|high|critical)\b"
+    r"|\b(low|medium|high|critical)\s+severity\b",
+    re.I,
+)
+_EVENT_ID_RE = re.compile(r"\b(?:event|incident|notam)\s*(?:id|no\.?|#)\s*[:\-]?\s*([\w\-]+)", re.I)
+_TIME = r"(?:(\d{4}-\d{2}-\d{2})\s+)?(\d{1,2}):(\d{2})(?:\s*(?:hrs|lt|local))?"
+_WINDOW_RES = [
+    ("range", re.compile(rf"\bbetween\s+{_TIME}\s*(?:–|—|-|and|to)\s*{_TIME}", re.I)),
+    ("range", re.compile(rf"\bfrom\s+{_TIME}\s*(?:to|–|—|-|until)\s*{_TIME}", re.I)),
+    ("onwards", re.compile(rf"\bfrom\s+{_TIME}\s+onwards\b", re.I)),
+    ("until", re.compile(rf"\buntil\s+{_TIME}", re.I)),
+]
+_BLOCK_SPLIT_RE = re.compile(r"\n\s*\n|\n(?=(?:event|incident|notam)\b|\d+[.)]\s)", re.I)
+_ACTION_RE = re.compile(r"^\s*actions?\s*[:\-]\s*(.+)$", re.I | re.M)
+# headers, footers and standing notices; a block is only skipped as boilerplate
+# when every sentence matches one of these and none mentions a disruption
+_BOILERPLATE_RE = re.compile(
+    r"\bpage\s+\d+(?:\s+of\s+\d+)?\b"
+    r"|\b(?:issued|prepared|compiled|published)\s+by\b"
+    r"|\brefer\s+to\b|\bcontact\s+(?:numbers?|details)\b"
+    r"|\bremains?\s+(?:unchanged|normal|unaffected)\b"
+    r"|\bfollows?\s+the\s+(?:published|seasonal|standard)\b"
+    r"|\bno\s+(?:changes?|impact)\b|\bend\s+of\s+(?:bulletin|report)\b|\bconfidential\b",
+    re.I,
+)
+_DISRUPTION_RE = re.compile(
+    r"\b(?:suspend|cancel|delay|divert|clos|strike|outage|disrupt|halt|grounded|evacuat|emergenc)",
+    re.I,
+)
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+_path_counts = Counter()
+_path_lock = threading.Lock()
+
+
+def _count_path(path: str) -> None:
+    with _path_lock:
+        _path_counts[path] += 1
+
+
+def extraction_path_stats() -> dict:
+    """
+    How chunks were resolved (cache, deterministic fast path or LLM), how many
+    LLM round trips they took, and how many events from overlapping chunks
+    were merged away.
+    """
+    with _path_lock:
+        counts = dict(_path_counts)
+    total = counts.get("cache", 0) + counts.get("fast_path", 0) + counts.get("llm", 0)
+    return {
+        "chunks": total,
+        "cache": counts.get("cache", 0),
+        "fast_path": counts.get("fast_path", 0),
+        "llm": counts.get("llm", 0),
+        "llm_requests": counts.get("llm_request", 0),
+        "fast_path_fraction": counts.get("fast_path", 0) / total if total else 0.0,
+        "boundary_duplicates_merged": counts.get("boundary_duplicate", 0),
+        "boundary_escalations": counts.get("boundary_escalation", 0),
+        "truncated_completions": counts.get("truncated", 0),
+    }
+
+
+def _format_time(date: Optional[str], hh: str, mm: str) -> str:
+    return f"{date or _today()} {int(hh):02d}:{mm}"
+
+
+def _extract_window(block: str):
+    """
+    Returns (start_time, end_time) or None when no window is stated.
+    """
+    for kind, rx in _WINDOW_RES:
+        m = rx.search(block)
+        if not m:
+            continue
+        g = m.groups()
+        if kind == "range":
+            start = _format_time(g[0], g[1], g[2])
+            end = _format_time(g[3] or g[0], g[4], g[5])
+            return start, end
+        if kind == "onwards":
+            return _format_time(*g), ""
+        return "", _format_time(*g)
+    return None
+
+
+def _is_boilerplate(block: str) -> bool:
+    sentences = [x for x in re.split(r"(?<=[.!?])\s+|\n", block) if x.strip()]
+    for i, x in enumerate(sentences):
+        if _DISRUPTION_RE.search(x):
+            return False
+        # a sentence cut at a chunk edge; the overlap repeats it whole next door
+        fragment = (i == 0 and not x.lstrip()[0].isupper()) or (
+            i == len(sentences) - 1 and x.rstrip()[-1] not in ".!?"
+        )
+        if not fragment and not _BOILERPLATE_RE.search(x):
+            return False
+    return True
+
+
+def _fast_extract_block(block: str):
+    """
+    Returns an event dict, "skip" for boilerplate, or None when ambiguous or
+    not understood.
+    """
+    types = [t for t, rx in _TYPE_RES.items() if rx.search(block)]
+    airports = []
+    for code in _IATA_RE.findall(block):
+        if code not in _NOT_IATA and code not in airports:
+            airports.append(code)
+    window = _extract_window(block)
+
+    if not types and not airports and window is None:
+        return "skip" if _is_boilerplate(block) else None
+    severities = {(a or b).capitalize() for a, b in _SEVERITY_RE.findall(block)}
+    if len(types) != 1 or len(severities) != 1 or not airports or window is None:
+        return None
+    start_time, end_time = window
+    # an overnight window without explicit dates is left to the LLM
+    if start_time and end_time and end_time < start_time:
+        return None
+
+    event_type = types[0]
+    m = _EVENT_ID_RE.search(block)
+    event_id = m.group(1) if m else "FP-" + content_key(block)[:8]
+
+    # impact = the narrative sentences, without list numbering and metadata lines
+    body = re.sub(r"^\s*\d+[.)]\s*", "", block)
+    sentences = [
+        s.strip()
+        for s in re.split(r"(?<=[.!?])\s+|\n", body)
+        if s.strip()
+        and not _ACTION_RE.match(s)
+        and not _EVENT_ID_RE.match(s.strip())
+        and _SEVERITY_RE.sub("", s).strip(" .:-")
+    ]
+    actions = [a.strip() for line in _ACTION_RE.findall(block) for a in line.split(";")]
+
+    return {
+        "event_id": event_id,
+        "event_type": [event_type],
+        "severity": [severities.pop()],
+        "impact_description": [s[:120] for s in sentences[:2]],
+        "airport_code": airports,
+        "start_time": start_time,
+        "end_time": end_time,
+        "actions": [a for a in actions if a] or list(DEFAULT_ACTIONS[event_type]),
+    }
+
+
+def fast_extract_events(text_chunk: str) -> Optional[List[Dict]]:
+    """
+    Rule-based extraction for well-formed IRROPS bulletins (explicit IATA codes,
+    severity words and time windows). Returns None when the chunk is ambiguous
+    and must go to the LLM, including any block that is neither such an event
+    nor recognisable boilerplate.
+    """
+    events = []
+    for block in _BLOCK_SPLIT_RE.split(text_chunk):
+        if not block.strip():
+            continue
+        ev = _fast_extract_block(block)
+        if ev is None:
+            return None
+        if ev != "skip":
+            events.append(ev)
+    return events or None
 
 
 # --------------- parse chunk ---------------
 def _repair_and_load_json(raw_output: str):
     """
-    Try to safely fix common truncation issues and parse JSON.
+    Parse the model output; if it is truncated or malformed, keep every
+    complete event object instead of guessing at missing brackets.
     """
     try:
         return json.loads(raw_output)
     except json.JSONDecodeError:
-        # attempt simple repairs: close unmatched brackets/quotes
-        repaired = raw_output
-        # close arrays/objects
-        open_sq = repaired.count("[") - repaired.count("]")
-        if open_sq > 0:
-            repaired += "]" * open_sq
-        open_br = repaired.count("{") - repaired.count("}")
-        if open_br > 0:
-            repaired += "}" * open_br
-        # If still broken, try to trim to last complete array/object
-        try:
-            return json.loads(repaired)
-        except Exception:
-            # As a last resort, try to find the first '[' and last ']' and substring
-            start = repaired.find("[")
-            end = repaired.rfind("]")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    return json.loads(repaired[start : end + 1])
-                except Exception:
-                    pass
+        events = EventStreamDecoder().feed(raw_output)
+        if not events:
             raise
+        return events
+
+
+def _normalize_event_fields(ev: Dict) -> Dict:
+    # Basic post-processing to ensure types
+    ev.setdefault("event_id", str(ev.get("event_id", "")))
+    # ensure lists
+    for k in (
+        "event_type",
+        "severity",
+        "impact_description",
+        "airport_code",
+        "actions",
+    ):
+        if k in ev and not isinstance(ev[k], list):
+            ev[k] = [ev[k]]
+    return ev
+
+
+def _extraction_prompt() -> str:
+    return EVENT_EXTRACTION_PROMPT.format(today_str=_today())
+
+
+def _chunk_cache_key(text_chunk: str) -> str:
+    # undated times resolve to today, so the same text means other events tomorrow
+    return content_key("chunk", PROMPT_VERSION, EXTRACTION_MODEL, _today(), text_chunk)
 
 
-def parse_event_chunk(text_chunk: str) -> List[Dict]:
+def _resolve_chunk_locally(text_chunk: str) -> Optional[List[Dict]]:
     """
-    Build prompt and call OpenAI synchronously; return parsed list of events.
+    Events for a chunk from the cache or the deterministic fast path, or None
+    when the chunk needs the LLM.
     """
-    system_instructions = """
-    Return ONLY a valid JSON array of event objects. No explanations, no extra text.
+    cached = extraction_cache.get(_chunk_cache_key(text_chunk))
+    if cached is not None:
+        _count_path("cache")
+        return cached
 
-    Event fields:
-    - event_id (string)
-    - event_type (array of types: Weather, Threat, Crew, Traffic, MechanicalFailure, Other)
-    - severity (array of: Low, Medium, High, Critical)
-    - impact_description (array of short strings)
-    - airport_code (array of IATA codes)
-    - start_time (YYYY-MM-DD HH:MM)
-    - end_time (YYYY-MM-DD HH:MM)
-    - actions (array of suggested action strings)
+    if FAST_PATH_ENABLED:
+        events = fast_extract_events(text_chunk)
+        if events is not None:
+            _count_path("fast_path")
+            return events
+    return None
 
-    TIME EXTRACTION RULES:
-    - If the text contains phrases like:
-      • "between X – Y"
-      • "from X to Y"
-      • "expected between X and Y"
-      • "from X onwards" → use X as start_time, leave end_time as empty string ""
-      • "until Y" → set end_time as Y
-    - If date is not mentioned, assume TODAY’s date: {today_str}.
-    - Preserve the local time exactly as written.
-    - Both start_time and end_time MUST be populated or empty string "".
-    - NEVER use the word "Unknown".
 
-    OTHER RULES:
-    - airport_code must be valid IATA codes.
-    - severity must reflect wording (e.g., "low-visibility" → Medium or High depending on context).
-    - impact_description must be short factual phrases.
-    - actions must be realistic airline operational actions.
-    - Ensure perfectly valid JSON (double quotes, no trailing commas).
+def _truncated(stream_status: dict, status: dict = None) -> bool:
+    """
+    True when the completion was cut off at max_tokens; its tail (and the
+    events in it) is missing, so nothing derived from it may be cached.
     """
+    if stream_status.get("finish_reason") != "length":
+        return False
+    _count_path("truncated")
+    print("[parser] completion hit max_tokens; events may be missing, not caching")
+    if status is not None:
+        status["truncated"] = True
+    return True
 
-    user_prompt = f"{system_instructions}\n\nPDF_CHUNK:\n{text_chunk}"
-    raw_output = _call_openai(user_prompt, max_tokens=1200)
-    events = _repair_and_load_json(raw_output)
-    # Basic post-processing to ensure types
-    for ev in events:
-        ev.setdefault("event_id", str(ev.get("event_id", "")))
-        # ensure lists
-        for k in (
-            "event_type",
-            "severity",
-            "impact_description",
-            "airport_code",
-            "actions",
-        ):
-            if k in ev and not isinstance(ev[k], list):
-                ev[k] = [ev[k]]
-    return events
-
-
-async def parse_event_data(full_text: str, chunk_size: int = 3000) -> List[Dict]:
-    """
-    Split full_text into chunks of ~chunk_size characters and parse each chunk.
+
+def _iter_llm_chunk(text_chunk: str, status: dict = None) -> Iterator[Dict]:
+    _count_path("llm")
+    _count_path("llm_request")
+    key = _chunk_cache_key(text_chunk)
+    user_prompt = f"{_extraction_prompt()}\n\nPDF_CHUNK:\n{text_chunk}"
+    decoder = EventStreamDecoder()
+    events = []
+    stream_status = {}
+    for delta in _stream_openai(
+        user_prompt, max_tokens=CHUNK_COMPLETION_TOKENS, status=stream_status
+    ):
+        for ev in decoder.feed(delta):
+            if not isinstance(ev, dict):
+                continue
+            events.append(_normalize_event_fields(ev))
+            yield ev
+    if not _truncated(stream_status, status):
+        extraction_cache.set(key, events)
+
+
+BATCH_INSTRUCTIONS = """
+    BATCH RULES:
+    - The input contains several PDF chunks, each starting with a line "### CHUNK <n> ###".
+    - Extract the events of every chunk.
+    - Add an integer field "chunk" to each event with the number of the chunk it came from.
+    - Return ONE JSON array with the events of all chunks.
+    """
+
+
+def iter_event_batch(text_chunks: List[str], status: dict = None) -> Iterator[tuple]:
+    """
+    Extract events for several chunks in one streamed request. Yields
+    (chunk_index, event) and caches the events of each chunk separately,
+    unless the completion was cut off.
+    """
+    _count_path("llm_request")
+    for _ in text_chunks:
+        _count_path("llm")
+    body = "\n\n".join(
+        f"### CHUNK {i} ###\n{chunk}" for i, chunk in enumerate(text_chunks, start=1)
+    )
+    keys = [_chunk_cache_key(chunk) for chunk in text_chunks]
+    user_prompt = f"{_extraction_prompt()}\n{BATCH_INSTRUCTIONS}\n\nPDF_CHUNKS:\n{body}"
+    # never less room per chunk than a single request gets
+    max_tokens = CHUNK_COMPLETION_TOKENS * len(text_chunks)
+
+    decoder = EventStreamDecoder()
+    per_chunk = [[] for _ in text_chunks]
+    attributed = True
+    stream_status = {}
+    for delta in _stream_openai(user_prompt, max_tokens=max_tokens, status=stream_status):
+        for ev in decoder.feed(delta):
+            if not isinstance(ev, dict):
+                continue
+            idx = ev.pop("chunk", None)
+            if not isinstance(idx, int) or not 1 <= idx <= len(text_chunks):
+                # cannot tell which chunk it belongs to; don't cache this batch
+                attributed = False
+                idx = 1
+            per_chunk[idx - 1].append(_normalize_event_fields(ev))
+            yield idx - 1, ev
+    # a truncated batch lost the events of its last chunk(s): cache none of them
+    if not _truncated(stream_status, status) and attributed:
+        for key, events in zip(keys, per_chunk):
+            extraction_cache.set(key, events)
+
+
+# --------------- token-aware chunking ---------------
+_encoding = None
+
+
+def _get_encoding():
+    """
+    tiktoken encoding for EXTRACTION_MODEL, or None when tiktoken is missing or
+    its BPE file cannot be loaded (e.g. offline); callers then estimate.
+    """
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                try:
+                    _encoding = tiktoken.encoding_for_model(EXTRACTION_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"[parser] tiktoken unavailable, estimating tokens: {e}")
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is None:
+        return math.ceil(len(text) / 4)
+    return len(enc.encode(text))
+
+
+def _tail_tokens(text: str, n: int) -> str:
+    enc = _get_encoding()
+    if enc is None:
+        return text[-n * 4 :]
+    return enc.decode(enc.encode(text)[-n:])
+
+
+def _token_windows(text: str, max_tokens: int) -> List[str]:
+    """
+    Hard-split a paragraph that is larger than max_tokens into token windows.
+    """
+    enc = _get_encoding()
+    if enc is None:
+        step = max_tokens * 4
+        return [text[i : i + step] for i in range(0, len(text), step)]
+    ids = enc.encode(text)
+    return [enc.decode(ids[i : i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+def _split_to_budget(text: str, max_tokens: int) -> List[str]:
+    """
+    Split an oversized paragraph on lines first, then on token windows.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    pieces = []
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        if count_tokens(line) <= max_tokens:
+            pieces.append(line)
+        else:
+            pieces.extend(_token_windows(line, max_tokens))
+    return pieces
+
+
+class ParagraphChunker:
+    """
+    Incrementally split page texts into chunks of at most max_tokens tokens on
+    paragraph ("\\n\\n") boundaries. Each new chunk starts with up to
+    overlap_tokens of trailing paragraphs from the previous one. feed() returns
+    the chunks that became full, so the first chunk is ready after roughly one page.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._tail = ""  # trailing paragraph that may continue on the next page
+        self._paras = []  # (text, tokens) of the chunk being built
+        self._tokens = 0
+
+    def _text(self) -> str:
+        return "\n\n".join(text for text, _ in self._paras)
+
+    def _overlap(self, incoming: int) -> List[tuple]:
+        budget = min(self.overlap_tokens, self.max_tokens - incoming)
+        keep, total = [], 0
+        for text, n in reversed(self._paras):
+            if total + n > budget:
+                break
+            keep.insert(0, (text, n))
+            total += n
+        if not keep and budget > 0 and self._paras:
+            # last paragraph alone is too large; carry its token tail instead
+            tail = _tail_tokens(self._paras[-1][0], budget)
+            keep = [(tail, count_tokens(tail))]
+        return keep
+
+    def _add(self, p: str) -> List[str]:
+        p = p.strip()
+        if not p:
+            return []
+        ready = []
+        for piece in _split_to_budget(p, self.max_tokens):
+            n = count_tokens(piece)
+            # +1 per paragraph for the "\n\n" separator
+            if self._paras and self._tokens + n + 1 > self.max_tokens:
+                ready.append(self._text())
+                self._paras = self._overlap(n + 1)
+                self._tokens = sum(t + 1 for _, t in self._paras)
+            self._paras.append((piece, n))
+            self._tokens += n + 1
+        return ready
+
+    def feed(self, page_text: str) -> List[str]:
+        self._tail += page_text + "\n"
+        *paragraphs, self._tail = self._tail.split("\n\n")
+        ready = []
+        for p in paragraphs:
+            ready.extend(self._add(p))
+        return ready
+
+    def flush(self) -> List[str]:
+        ready = self._add(self._tail)
+        self._tail = ""
+        if self._paras:
+            ready.append(self._text())
+            self._paras, self._tokens = [], 0
+        return ready
+
+
+def iter_text_chunks(
+    pages: Iterable[str],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[str]:
+    chunker = ParagraphChunker(max_tokens, overlap_tokens)
+    for page_text in pages:
+        yield from chunker.feed(page_text)
+    yield from chunker.flush()
+
+
+async def aiter_text_chunks(
+    pages: AsyncIterator[str],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> AsyncIterator[str]:
+    chunker = ParagraphChunker(max_tokens, overlap_tokens)
+    async for page_text in pages:
+        for chunk in chunker.feed(page_text):
+            yield chunk
+    for chunk in chunker.flush():
+        yield chunk
+
+
+async def _aiter(items: Iterable[str]) -> AsyncIterator[str]:
+    for item in items:
+        yield item
+
+
+# --------------- boundary deduplication ---------------
+def event_dedup_key(ev: Dict) -> tuple:
+    """
+    Events from overlapping chunks are the same event when they share
+    airport(s), type(s) and time window.
+    """
+    return (
+        tuple(sorted(str(a).strip().upper() for a in as_list(ev.get("airport_code")))),
+        tuple(sorted(str(t).strip().lower() for t in as_list(ev.get("event_type")))),
+        str(ev.get("start_time") or "").strip(),
+        str(ev.get("end_time") or "").strip(),
+    )
+
+
+def merge_event(into: Dict, other: Dict) -> Dict:
+    """
+    Fold a duplicate into an existing event: union list fields, keep the
+    highest severity.
+    """
+    for k in ("impact_description", "actions"):
+        merged = list(as_list(into.get(k)))
+        for item in as_list(other.get(k)):
+            if item not in merged:
+                merged.append(item)
+        into[k] = merged
+    severities = as_list(into.get("severity")) + as_list(other.get("severity"))
+    if severities:
+        top = max(severities, key=lambda s: SEVERITY_RANK.get(str(s).lower(), -1))
+        into["severity"] = [top]
+    return into
+
+
+_CHUNK_DONE = object()
+
+
+async def stream_chunk_events(
+    chunks: AsyncIterator[str],
+    max_workers: int = 2,
+    batch_tokens: int = BATCH_TOKENS,
+    chunk_tokens: int = CHUNK_TOKENS,
+    status: dict = None,
+) -> AsyncIterator[Dict]:
+    """
+    Resolve each chunk as soon as it is produced and yield events as the model
+    streams them, in document order. Chunks served from the cache or the fast
+    path skip the LLM; the rest are packed into batches of up to batch_tokens
+    input tokens (and BATCH_MAX_COMPLETION_TOKENS of output), sent as soon as
+    no further full chunk would fit. Each event is yielded the moment it is
+    decoded. An event repeated from the previous chunk's overlap (same
+    airport, type and stated time window) is dropped, unless it is more
+    severe: then the merged event is yielded again and EVENT_INDEX routes it
+    as an escalation. Events without a start time are never deduplicated.
+    status["truncated"] is set when a completion was cut off, so the caller
+    must not cache the result.
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()  # (queue, future) per unit of work, in document order
+    recent = {}  # chunk number -> {dedup key: event as yielded}, last two chunks only
+    next_chunk = 0
+    batch, batch_size = [], 0
+    # keep each batch's completion budget within BATCH_MAX_COMPLETION_TOKENS
+    max_batch = max(1, BATCH_MAX_COMPLETION_TOKENS // CHUNK_COMPLETION_TOKENS)
+
+    def _run(first, local, llm_chunks, q: asyncio.Queue):
+        # worker thread: hand each event to the loop the moment it is decoded
+        try:
+            if local is not None:
+                events = ((0, ev) for ev in local)
+            elif len(llm_chunks) == 1:
+                events = ((0, ev) for ev in _iter_llm_chunk(llm_chunks[0], status))
+            else:
+                events = iter_event_batch(llm_chunks, status)
+            for i, ev in events:
+                # the worker may still cache its own copy while the loop yields it
+                loop.call_soon_threadsafe(q.put_nowait, (first + i, copy.deepcopy(ev)))
+        finally:
+            loop.call_soon_threadsafe(q.put_nowait, _CHUNK_DONE)
+
+    def _submit(local=None, llm_chunks=None):
+        nonlocal next_chunk
+        q = asyncio.Queue()
+        pending.append((q, loop.run_in_executor(exe, _run, next_chunk, local, llm_chunks, q)))
+        next_chunk += len(llm_chunks) if llm_chunks else 1
+
+    def _take(item) -> Optional[Dict]:
+        """
+        The event to yield for one decoded (chunk number, event), or None.
+        """
+        n, ev = item
+        for old in [c for c in recent if c < n - 1]:
+            del recent[old]
+        if parse_time(ev.get("start_time")) is None:
+            return ev
+        key = event_dedup_key(ev)
+        first = recent.get(n, {}).get(key) or recent.get(n - 1, {}).get(key)
+        if first is None:
+            recent.setdefault(n, {})[key] = ev
+            return ev
+        _count_path("boundary_duplicate")
+        if severity_rank(ev) <= severity_rank(first):
+            return None
+        # never mutate the copy already yielded
+        escalated = merge_event(copy.deepcopy(first), ev)
+        recent.setdefault(n, {})[key] = escalated
+        _count_path("boundary_escalation")
+        return escalated
+
+    with ThreadPoolExecutor(max_workers=max_workers) as exe:
+        async for chunk in chunks:
+            # cache lookup and fast path off the loop: the cache may wait on a commit
+            local = await asyncio.to_thread(_resolve_chunk_locally, chunk)
+            if local is not None:
+                # keep document order: send what is batched so far first
+                if batch:
+                    _submit(llm_chunks=batch)
+                    batch, batch_size = [], 0
+                _submit(local=local)
+            else:
+                n = count_tokens(chunk)
+                if batch and batch_size + n > batch_tokens:
+                    _submit(llm_chunks=batch)
+                    batch, batch_size = [], 0
+                batch.append(chunk)
+                batch_size += n
+                if batch_size + chunk_tokens > batch_tokens or len(batch) >= max_batch:
+                    _submit(llm_chunks=batch)
+                    batch, batch_size = [], 0
+            # hand out whatever is already decoded without waiting on the LLM
+            while pending and not pending[0][0].empty():
+                q, fut = pending[0]
+                item = q.get_nowait()
+                if item is _CHUNK_DONE:
+                    pending.popleft()
+                    await fut  # re-raise a failed chunk
+                    continue
+                ev = _take(item)
+                if ev is not None:
+                    yield ev
+        if batch:
+            _submit(llm_chunks=batch)
+        while pending:
+            q, fut = pending[0]
+            item = await q.get()
+            if item is _CHUNK_DONE:
+                pending.popleft()
+                await fut
+                continue
+            ev = _take(item)
+            if ev is not None:
+                yield ev
+
+
+def _chunking_tag(max_tokens: int, overlap_tokens: int) -> str:
+    return f"tok{max_tokens}/{overlap_tokens}"
+
+
+async def stream_pdf_events(
+    pdf,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> AsyncIterator[Dict]:
+    """
+    Page-by-page pipeline: PDF pages (process pool) -> incremental chunks -> LLM extraction.
+    Yields events while later pages are still being read and parsed.
+    An unchanged PDF is answered from the document cache without extraction.
+    pdf is the PDF bytes or the path of a (spooled) PDF file.
+    """
+    doc_key = await asyncio.to_thread(
+        _pdf_digest,
+        pdf,
+        "pdf",
+        PROMPT_VERSION,
+        EXTRACTION_MODEL,
+        _today(),
+        _chunking_tag(max_tokens, overlap_tokens),
+    )
+    cached = await asyncio.to_thread(extraction_cache.get, doc_key)
+    if cached is not None:
+        for ev in cached:
+            yield ev
+        return
+
+    events = []
+    status = {}
+    chunks = aiter_text_chunks(aiter_pdf_pages(pdf), max_tokens, overlap_tokens)
+    async for ev in stream_chunk_events(chunks, chunk_tokens=max_tokens, status=status):
+        events.append(ev)
+        yield ev
+    if not status.get("truncated"):
+        await asyncio.to_thread(extraction_cache.set, doc_key, events)
+
+
+async def parse_event_data(
+    full_text: str,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Dict]:
+    """
+    Split full_text into token-budgeted, overlapping chunks and parse each chunk.
     This function is async but calls blocking OpenAI in a thread to avoid blocking event loop.
     """
     if not full_text:
         return []
 
-    # split into approximate chunks by paragraphs
-    paragraphs = [p for p in full_text.split("\n\n") if p.strip()]
-    chunks = []
-    cur = ""
-    for p in paragraphs:
-        if len(cur) + len(p) + 2 > chunk_size:
-            chunks.append(cur)
-            cur = p
-        else:
-            cur = (cur + "\n\n" + p).strip()
-    if cur:
-        chunks.append(cur)
-
-    loop = asyncio.get_event_loop()
-    results = []
-    with ThreadPoolExecutor(max_workers=2) as exe:
-        tasks = [
-            loop.run_in_executor(exe, parse_event_chunk, chunk) for chunk in chunks
-        ]
-        completed = await asyncio.gather(*tasks)
-        for evs in completed:
-            results.extend(evs)
+    doc_key = content_key(
+        "doc",
+        PROMPT_VERSION,
+        EXTRACTION_MODEL,
+        _today(),
+        _chunking_tag(max_tokens, overlap_tokens),
+        full_text,
+    )
+    cached = await asyncio.to_thread(extraction_cache.get, doc_key)
+    if cached is not None:
+        return cached
+
+    status = {}
+    chunks = _aiter(iter_text_chunks([full_text], max_tokens, overlap_tokens))
+    results = [
+        ev async for ev in stream_chunk_events(chunks, chunk_tokens=max_tokens, status=status)
+    ]
+    if not status.get("truncated"):
+        await asyncio.to_thread(extraction_cache.set, doc_key, results)
     return results
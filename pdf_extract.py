@@ -0,0 +1,54 @@
+# pdf_extract.py
+"""
+Page extraction run in parser's process pool. Kept apart from parser so the
+pool's (forkserver/spawn) children only import PyPDF2, not the OpenAI client
+and the extraction cache.
+"""
+import mmap
+import os
+from contextlib import contextmanager
+from io import BytesIO
+from typing import List
+
+import PyPDF2
+
+
+@contextmanager
+def open_pdf(pdf):
+    """
+    File-like view of a PDF given as bytes or as a path. Files are
+    memory-mapped, so large PDFs are paged in by the OS instead of read
+    into the Python heap.
+    """
+    if isinstance(pdf, (bytes, bytearray)):
+        yield BytesIO(pdf)
+        return
+    with open(pdf, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield BytesIO(b"")
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def count_pdf_pages(pdf) -> int:
+    with open_pdf(pdf) as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_page_range(pdf, start: int, stop: int) -> List[str]:
+    """
+    Worker-process entry point: extract pages [start, stop) of one PDF.
+    A path is sent instead of the bytes when the PDF is on disk.
+    """
+    texts = []
+    with open_pdf(pdf) as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages[start:stop]:
+            try:
+                page_text = page.extract_text()
+            except Exception:
+                page_text = ""
+            if page_text:
+                texts.append(page_text)
+    return texts
@@ -1,19 +1,625 @@
 # task_queue.py
 import asyncio
+import os
+import random
+import socket
+import time
 import traceback
+from collections import deque
+from datetime import datetime, timezone
 
-TASK_QUEUE = asyncio.Queue()
+import asyncpg
+import httpx
+import openai
 
+from database import (
+    agent_task_counts,
+    claim_agent_tasks,
+    claim_and_enqueue_agent_tasks,
+    claim_coalesced_tasks,
+    complete_agent_tasks,
+    enqueue_agent_task,
+    insert_dead_letter,
+)
 
-async def task_worker():
-    print("[task_worker] started")
-    while True:
-        agent_callable, payload = await TASK_QUEUE.get()
+# overall number of agent tasks running at once (keep within LLM rate limits)
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", 8))
+# per-agent caps, keyed by agent function name: "crew_agent=2,monitoring_agent=8"
+AGENT_CONCURRENCY = os.getenv("AGENT_CONCURRENCY", "crew_agent=2,monitoring_agent=8")
+# priority = severity level + agent offset (lower runs first), clamped to
+# 0..TASK_PRIORITY_LEVELS-1
+SEVERITY_PRIORITY = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+AGENT_PRIORITY_OFFSET = os.getenv(
+    "AGENT_PRIORITY_OFFSET", "bomb_threat_agent=-1,monitoring_agent=2"
+)
+TASK_PRIORITY_LEVELS = int(os.getenv("TASK_PRIORITY_LEVELS", 6))
+# a waiting task moves up one priority level per this many seconds
+TASK_AGING_SECONDS = float(os.getenv("TASK_AGING_SECONDS", 30))
+# wait times kept per priority level for the percentiles
+_WAIT_SAMPLES = 1000
+
+# admission control: at most TASK_QUEUE_MAX_DEPTH queued tasks (put() waits
+# for room); /upload answers 429 from TASK_QUEUE_SATURATION * max depth on
+TASK_QUEUE_MAX_DEPTH = int(os.getenv("TASK_QUEUE_MAX_DEPTH", 1000))
+TASK_QUEUE_SATURATION = float(os.getenv("TASK_QUEUE_SATURATION", 0.8))
+# low-value agents whose work is shed (or, with TASK_SHED_POLICY=downgrade,
+# queued at the lowest priority) once their queue reaches its high-water mark
+TASK_SHEDDABLE_AGENTS = set(
+    a.strip() for a in os.getenv("TASK_SHEDDABLE_AGENTS", "monitoring_agent").split(",") if a.strip()
+)
+AGENT_HIGH_WATER = os.getenv("AGENT_HIGH_WATER", "monitoring_agent=200")
+TASK_SHED_POLICY = os.getenv("TASK_SHED_POLICY", "shed")
+
+# "memory" (in-process) or "postgres" (durable, shared by every app and worker.py)
+TASK_QUEUE_BACKEND = os.getenv("TASK_QUEUE_BACKEND", "memory")
+# postgres backend: seconds a claimed task stays hidden before another
+# consumer may take it over, tasks claimed ahead per node, and idle poll interval
+TASK_VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", 600))
+TASK_PREFETCH = int(os.getenv("TASK_PREFETCH", 0)) or None
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", 1.0))
+TASK_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# per-agent deadline in seconds, keyed by agent function name; others get TASK_TIMEOUT
+TASK_TIMEOUT = float(os.getenv("TASK_TIMEOUT", 120))
+AGENT_TIMEOUTS = os.getenv("AGENT_TIMEOUTS", "crew_agent=180,monitoring_agent=10")
+# transient failures are retried up to TASK_MAX_ATTEMPTS runs in total, waiting
+# TASK_RETRY_BASE * 2^n seconds (capped at TASK_RETRY_MAX, with jitter) between
+# runs; anything else, or the last failure, goes to the dead_letters table.
+# With the postgres backend keep TASK_VISIBILITY_TIMEOUT above the worst case.
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 3))
+TASK_RETRY_BASE = float(os.getenv("TASK_RETRY_BASE", 2))
+TASK_RETRY_MAX = float(os.getenv("TASK_RETRY_MAX", 60))
+
+# errors worth another attempt: deadlines, network, rate limits, 5xx, DB connection
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    OSError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.TooManyConnectionsError,
+)
+
+# agent function name -> callable, for tasks read back from Postgres
+AGENT_REGISTRY = {}
+
+
+def register_agents(agent_map: dict) -> None:
+    for agent_callable in agent_map.values():
+        AGENT_REGISTRY[agent_name(agent_callable)] = agent_callable
+
+
+def _parse_limits(spec: str, cast=int) -> dict:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, n = part.split("=", 1)
+            limits[name.strip()] = cast(n)
+    return limits
+
+
+def agent_name(agent_callable) -> str:
+    return getattr(agent_callable, "__name__", str(agent_callable))
+
+
+def task_priority(agent: str, payload, offsets: dict) -> int:
+    severity = payload.get("severity") if isinstance(payload, dict) else None
+    if isinstance(severity, list):
+        severity = severity[0] if severity else None
+    level = SEVERITY_PRIORITY.get(str(severity).strip().lower(), 2)
+    level += offsets.get(agent, 0)
+    return max(0, min(TASK_PRIORITY_LEVELS - 1, level))
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Backoff before retry number `attempt` (1-based): capped exponential, full jitter.
+    """
+    return random.uniform(0, min(TASK_RETRY_MAX, TASK_RETRY_BASE * 2 ** (attempt - 1)))
+
+
+def _percentile(sorted_vals: list, q: float):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+class TaskQueue:
+    """
+    Priority queue of (agent_callable, payload) tasks with per-agent
+    concurrency caps. put() has the asyncio.Queue signature; get() hands out
+    the most urgent task whose agent is below its cap and task_done(item)
+    frees the slot, so a backlog of one slow agent never holds up the others.
+
+    Urgency is task_priority() (event severity plus agent offset) minus one
+    level per TASK_AGING_SECONDS waited, so low-priority work is delayed but
+    never starved.
+
+    The queue is bounded: put() waits while max_depth tasks are queued, and
+    work for TASK_SHEDDABLE_AGENTS is shed or downgraded instead of waiting
+    once the queue is full or the agent is past its high-water mark.
+    """
+
+    def __init__(
+        self,
+        limits: dict = None,
+        offsets: dict = None,
+        aging: float = TASK_AGING_SECONDS,
+        max_depth: int = TASK_QUEUE_MAX_DEPTH,
+        high_water: dict = None,
+    ):
+        self.limits = limits if limits is not None else _parse_limits(AGENT_CONCURRENCY)
+        self.offsets = offsets if offsets is not None else _parse_limits(AGENT_PRIORITY_OFFSET)
+        self.aging = aging
+        self.max_depth = max_depth
+        self.high_water = high_water if high_water is not None else _parse_limits(AGENT_HIGH_WATER)
+        self.shed = {}  # agent name -> tasks dropped
+        self.downgraded = {}  # agent name -> tasks queued at the lowest priority
+        # agent name -> one FIFO deque of (enqueued_at, item) per priority level
+        self._pending = {}
+        self._running = {}  # agent name -> running count
+        self._waits = [deque(maxlen=_WAIT_SAMPLES) for _ in range(TASK_PRIORITY_LEVELS)]
+        self._cond = asyncio.Condition()
+
+    def qsize(self) -> int:
+        return sum(len(q) for levels in self._pending.values() for q in levels)
+
+    def depth(self) -> int:
+        return self.qsize()
+
+    def agent_depth(self, name: str) -> int:
+        return sum(len(q) for q in self._pending.get(name, ()))
+
+    def saturated(self) -> bool:
+        return self.depth() >= TASK_QUEUE_SATURATION * self.max_depth
+
+    def _admit(self, name: str, level: int):
+        """
+        Priority level to queue the task at, or None to shed it.
+        """
+        if name not in TASK_SHEDDABLE_AGENTS:
+            return level
+        full = self.depth() >= self.max_depth
+        if not full and self.agent_depth(name) < self.high_water.get(name, float("inf")):
+            return level
+        if TASK_SHED_POLICY == "downgrade" and not full:
+            self.downgraded[name] = self.downgraded.get(name, 0) + 1
+            return TASK_PRIORITY_LEVELS - 1
+        self.shed[name] = self.shed.get(name, 0) + 1
+        return None
+
+    async def put(self, item) -> bool:
+        """
+        Queue a task; False when admission control shed it.
+        """
+        name = agent_name(item[0])
+        level = self._admit(name, task_priority(name, item[1], self.offsets))
+        if level is None:
+            return False
+        async with self._cond:
+            # backpressure: the caller (routing) waits for the workers
+            while self.qsize() >= self.max_depth:
+                await self._cond.wait()
+        await self._push(item, time.monotonic(), level)
+        return True
+
+    async def _push(self, item, enqueued_at: float, level: int = None) -> None:
+        async with self._cond:
+            name = agent_name(item[0])
+            if level is None:
+                level = task_priority(name, item[1], self.offsets)
+            levels = self._pending.get(name)
+            if levels is None:
+                levels = self._pending[name] = [deque() for _ in range(TASK_PRIORITY_LEVELS)]
+            levels[level].append((enqueued_at, item))
+            # getters and put() waiting for room share the condition
+            self._cond.notify_all()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def _next(self):
+        now = time.monotonic()
+        best, best_key = None, None
+        for name, levels in self._pending.items():
+            if self._running.get(name, 0) >= self.limits.get(name, float("inf")):
+                continue
+            # the head of each level is its oldest task, so only heads compete
+            for level, q in enumerate(levels):
+                if not q:
+                    continue
+                enqueued_at = q[0][0]
+                key = (level - (now - enqueued_at) / self.aging, enqueued_at)
+                if best_key is None or key < best_key:
+                    best, best_key = (name, level), key
+        if best is None:
+            return None
+        name, level = best
+        enqueued_at, item = self._pending[name][level].popleft()
+        self._waits[level].append(now - enqueued_at)
+        self._running[name] = self._running.get(name, 0) + 1
+        self._cond.notify_all()
+        return item
+
+    async def get(self):
+        async with self._cond:
+            while True:
+                item = self._next()
+                if item is not None:
+                    return item
+                await self._cond.wait()
+
+    async def task_done(self, item) -> None:
+        async with self._cond:
+            self._running[agent_name(item[0])] -= 1
+            # a capped agent may have become eligible for any waiting worker
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        names = set(self._pending) | set(self._running)
+        return {
+            name: {
+                "queued": sum(len(q) for q in self._pending.get(name, ())),
+                "running": self._running.get(name, 0),
+                "limit": self.limits.get(name),
+            }
+            for name in sorted(names)
+        }
+
+    def admission_stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "saturated": self.saturated(),
+            "high_water": self.high_water,
+            "shed_policy": TASK_SHED_POLICY,
+            "shed": dict(self.shed),
+            "downgraded": dict(self.downgraded),
+        }
+
+    def priority_stats(self) -> dict:
+        """
+        Queue depth and wait-time percentiles (seconds) per priority level.
+        """
+        report = {}
+        for level in range(TASK_PRIORITY_LEVELS):
+            waits = sorted(self._waits[level])
+            report[level] = {
+                "depth": sum(len(levels[level]) for levels in self._pending.values()),
+                "dequeued": len(waits),
+                "wait_p50": _percentile(waits, 0.50),
+                "wait_p90": _percentile(waits, 0.90),
+                "wait_p99": _percentile(waits, 0.99),
+            }
+        return report
+
+
+class PostgresTaskQueue(TaskQueue):
+    """
+    Durable TaskQueue: put() inserts into agent_tasks and every node runs a
+    fetcher that claims batches with FOR UPDATE SKIP LOCKED into the local
+    scheduler (caps and priorities as in TaskQueue). task_done() deletes the
+    row; a task whose node dies reappears after TASK_VISIBILITY_TIMEOUT.
+    Items are (agent_callable, payload, task_ids): a claimed task with a
+    coalesce key takes the rest of its group along and runs them merged.
+
+    Admission uses the table's backlog (refreshed by the fetcher); put()
+    does not wait for room since queued tasks live in Postgres, not memory.
+    """
+
+    def __init__(self, prefetch: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.prefetch = prefetch or TASK_PREFETCH or TASK_WORKERS
+        self._wakeup = asyncio.Event()
+        self._fetcher = None
+        self._backlog = {}  # agent name -> rows in agent_tasks
+        self._backlog_at = 0.0
+        self.claimed = 0
+        self.coalesced = 0
+
+    def depth(self) -> int:
+        return sum(self._backlog.values())
+
+    def agent_depth(self, name: str) -> int:
+        return self._backlog.get(name, 0)
+
+    def agent_held(self, name: str) -> int:
+        # claimed by this node and waiting for a worker
+        return sum(len(q) for q in self._pending.get(name, ()))
+
+    async def put(self, item) -> bool:
+        name = agent_name(item[0])
+        level = self._admit(name, task_priority(name, item[1], self.offsets))
+        if level is None:
+            return False
+        await enqueue_agent_task(name, item[1], level)
+        self._backlog[name] = self._backlog.get(name, 0) + 1
+        self._wakeup.set()
+        return True
+
+    async def put_claimed(
+        self, decision_id: int, agents: list, payload, owner: str, coalesce: list = None
+    ) -> list:
+        """
+        Claim (decision_id, agent) for each (agent key, callable) in agents and
+        insert the tasks in the same statement. coalesce holds a (group key,
+        window) or None per agent. Returns the agent keys won.
+        """
+        names = [agent_name(fn) for _, fn in agents]
+        levels = [self._admit(name, task_priority(name, payload, self.offsets)) for name in names]
+        coalesce = coalesce or [None] * len(agents)
+        claimed = await claim_and_enqueue_agent_tasks(
+            decision_id,
+            [key for key, _ in agents],
+            names,
+            levels,
+            payload,
+            owner,
+            [c[0] if c else None for c in coalesce],
+            [c[1] if c else 0.0 for c in coalesce],
+        )
+        for (key, _), name, level in zip(agents, names, levels):
+            if key in claimed and level is not None:
+                self._backlog[name] = self._backlog.get(name, 0) + 1
+        self._wakeup.set()
+        return claimed
+
+    async def _refresh_backlog(self) -> None:
+        if time.monotonic() - self._backlog_at < TASK_POLL_INTERVAL:
+            return
+        counts = await agent_task_counts()
+        self._backlog = {
+            agent: sum(s["count"] for s in statuses.values()) for agent, statuses in counts.items()
+        }
+        self._backlog_at = time.monotonic()
+
+    async def start(self) -> None:
+        if self._fetcher is None:
+            self._fetcher = asyncio.create_task(self._fetch_loop())
+
+    async def stop(self) -> None:
+        if self._fetcher is not None:
+            self._fetcher.cancel()
+            await asyncio.gather(self._fetcher, return_exceptions=True)
+            self._fetcher = None
+
+    async def _fetch_loop(self):
+        while True:
+            free = self.prefetch - self.qsize()
+            # lease no more per agent than its cap leaves room for here, so
+            # capped agents' tasks stay claimable by other nodes
+            agents, agent_limits = [], []
+            for name in AGENT_REGISTRY:
+                held = self._running.get(name, 0) + self.agent_held(name)
+                room = min(free, self.limits.get(name, free) - held)
+                if room > 0:
+                    agents.append(name)
+                    agent_limits.append(room)
+            rows = []
+            try:
+                await self._refresh_backlog()
+            except Exception as e:
+                print(f"[task_queue] backlog refresh failed: {e}")
+            if free > 0 and agents:
+                try:
+                    rows = await claim_agent_tasks(
+                        agents, agent_limits, free, TASK_OWNER, TASK_VISIBILITY_TIMEOUT, self.aging
+                    )
+                except Exception as e:
+                    print(f"[task_queue] claim failed: {e}")
+            # the first claimed task of a coalesce group leads it; the group's
+            # other claimed rows and its not yet visible ones run along
+            leaders, groups = [], {}
+            for row in rows:
+                key = row["coalesce_key"]
+                if key is None:
+                    leaders.append(row)
+                elif key in groups:
+                    groups[key].append(row)
+                else:
+                    groups[key] = []
+                    leaders.append(row)
+            if groups:
+                try:
+                    for extra in await claim_coalesced_tasks(
+                        list(groups), TASK_OWNER, TASK_VISIBILITY_TIMEOUT
+                    ):
+                        groups[extra["coalesce_key"]].append(extra)
+                except Exception as e:
+                    print(f"[task_queue] coalesced claim failed: {e}")
+            now_wall, now_mono = datetime.now(timezone.utc), time.monotonic()
+            for row in leaders:
+                waited = (now_wall - row["enqueued_at"]).total_seconds()
+                extras = groups.get(row["coalesce_key"], []) if row["coalesce_key"] else []
+                for item in self._group_items(row, extras):
+                    await self._push(item, now_mono - waited, row["priority"])
+            self.claimed += len(rows)
+            if rows and len(rows) == free:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), TASK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _group_items(self, row: dict, extras: list) -> list:
+        agent_callable = AGENT_REGISTRY[row["agent"]]
+        group = [row] + extras
+        if extras:
+            # imported here: coalescer sits on top of this module
+            from coalescer import merge_events
+
+            try:
+                payload = merge_events([r["payload"] for r in group])
+            except Exception as e:
+                print(f"[task_queue] could not merge {row['coalesce_key']}, running separately: {e!r}")
+            else:
+                self.coalesced += len(extras)
+                print(f"[task_queue] {row['coalesce_key']}: {len(group)} tasks in one run")
+                return [(agent_callable, payload, [r["id"] for r in group])]
+        return [(agent_callable, r["payload"], [r["id"]]) for r in group]
+
+    async def task_done(self, item) -> None:
         try:
-            res = await agent_callable(payload)
-            print(f"[task_worker] {agent_callable.__name__} done: {res}")
-        except Exception as e:
-            print(f"[task_worker] error in {agent_callable}: {e}")
-            traceback.print_exc()
+            await complete_agent_tasks(item[2])
         finally:
-            await asyncio.sleep(0.01)
+            await super().task_done(item)
+            # a slot freed up: top up the local buffer
+            self._wakeup.set()
+
+    async def durable_stats(self) -> dict:
+        return {
+            "owner": TASK_OWNER,
+            "claimed": self.claimed,
+            "coalesced": self.coalesced,
+            "tasks": await agent_task_counts(),
+        }
+
+
+TASK_QUEUE = PostgresTaskQueue() if TASK_QUEUE_BACKEND == "postgres" else TaskQueue()
+
+
+class WorkerPool:
+    """
+    TASK_WORKERS coroutines running agents from TASK_QUEUE concurrently.
+    """
+
+    def __init__(self, queue: TaskQueue = TASK_QUEUE, size: int = TASK_WORKERS):
+        self.queue = queue
+        self.size = size
+        self.timeouts = _parse_limits(AGENT_TIMEOUTS, float)
+        self._tasks = []
+        self._workers = []
+        self.started_at = None
+        self.retries = 0
+        self.timed_out = 0
+        self.dead_lettered = 0
+
+    async def start(self) -> None:
+        await self.queue.start()
+        self.started_at = time.monotonic()
+        self._workers = [
+            {
+                "worker": i,
+                "agent": None,
+                "event_id": None,
+                "since": None,
+                "tasks": 0,
+                "errors": 0,
+                "busy_seconds": 0.0,
+            }
+            for i in range(self.size)
+        ]
+        self._tasks = [asyncio.create_task(self._run(w)) for w in self._workers]
+        print(f"[task_worker] started {self.size} workers, limits {self.queue.limits}")
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.queue.stop()
+
+    async def _run(self, w: dict):
+        while True:
+            item = await self.queue.get()
+            agent_callable, payload = item[0], item[1]
+            w["agent"] = agent_name(agent_callable)
+            w["event_id"] = payload.get("event_id") if isinstance(payload, dict) else None
+            w["since"] = time.monotonic()
+            try:
+                res = await self._attempt(w, agent_callable, payload)
+                print(f"[task_worker] {w['agent']} done: {res}")
+            except asyncio.CancelledError:
+                # shutting down mid-task: a durable task is left to be re-claimed
+                w["agent"] = w["event_id"] = w["since"] = None
+                raise
+            except Exception as e:
+                w["errors"] += 1
+                print(f"[task_worker] error in {w['agent']}: {e!r}")
+                traceback.print_exc()
+                await self._dead_letter(w, payload, e)
+            w["busy_seconds"] += time.monotonic() - w["since"]
+            w["tasks"] += 1
+            w["agent"] = w["event_id"] = w["since"] = None
+            try:
+                await self.queue.task_done(item)
+            except Exception as e:
+                # keep the worker alive; an unacknowledged durable task
+                # reappears once its visibility timeout passes
+                print(f"[task_worker] could not acknowledge {agent_name(agent_callable)}: {e!r}")
+                traceback.print_exc()
+
+    async def _attempt(self, w: dict, agent_callable, payload):
+        """
+        Run one task under the agent's deadline, retrying transient failures.
+        """
+        timeout = self.timeouts.get(w["agent"], TASK_TIMEOUT)
+        w["attempts"] = 0
+        while True:
+            w["attempts"] += 1
+            try:
+                return await asyncio.wait_for(agent_callable(payload), timeout)
+            except TRANSIENT_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timed_out += 1
+                    e = asyncio.TimeoutError(f"{w['agent']} exceeded {timeout:g}s")
+                if w["attempts"] >= TASK_MAX_ATTEMPTS:
+                    raise e from None
+                delay = retry_delay(w["attempts"])
+                self.retries += 1
+                print(
+                    f"[task_worker] {w['agent']} attempt {w['attempts']} failed ({e!r}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _dead_letter(self, w: dict, payload, error: Exception) -> None:
+        try:
+            dead_id = await insert_dead_letter(
+                w["agent"], payload, f"{type(error).__name__}: {error}", w.get("attempts", 1)
+            )
+        except Exception as e:
+            # the task is still acknowledged; the payload is at least in the log
+            print(f"[task_worker] could not dead-letter {w['agent']} {payload}: {e}")
+            return
+        self.dead_lettered += 1
+        print(f"[task_worker] {w['agent']} dead-lettered as #{dead_id}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        uptime = now - self.started_at if self.started_at else 0.0
+        workers = []
+        for w in self._workers:
+            busy = w["busy_seconds"] + (now - w["since"] if w["since"] else 0.0)
+            workers.append(
+                {
+                    "worker": w["worker"],
+                    "state": "busy" if w["since"] else "idle",
+                    "agent": w["agent"],
+                    "event_id": w["event_id"],
+                    "running_for": now - w["since"] if w["since"] else None,
+                    "tasks": w["tasks"],
+                    "errors": w["errors"],
+                    "utilization": busy / uptime if uptime else 0.0,
+                }
+            )
+        return {
+            "workers": workers,
+            "busy": sum(1 for w in self._workers if w["since"]),
+            "size": self.size,
+            "retries": self.retries,
+            "timed_out": self.timed_out,
+            "dead_lettered": self.dead_lettered,
+            "agents": self.queue.stats(),
+            "priorities": self.queue.priority_stats(),
+        }
+
+
+WORKER_POOL = WorkerPool()
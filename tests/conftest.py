@@ -0,0 +1,7 @@
+import os
+import sys
+
+# modules create OpenAI clients at import time; no request is made in the tests
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LANGSMITH_TRACING", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,101 @@
+import asyncio
+
+from coalescer import TaskCoalescer, merge_events
+from task_queue import TaskQueue
+
+
+def _event(event_id, severity, description, start, end, airport="DEL"):
+    # shape produced by parser.extract_events / fast_extract_events
+    return {
+        "event_id": event_id,
+        "event_type": ["Weather"],
+        "severity": [severity],
+        "impact_description": [description],
+        "airport_code": [airport],
+        "start_time": start,
+        "end_time": end,
+        "actions": ["Reschedule flights", "Notify passengers"],
+    }
+
+
+async def weather_agent(event):
+    return event
+
+
+async def monitoring_agent(event):
+    return event
+
+
+def test_merge_events_parser_shape():
+    merged = merge_events(
+        [
+            _event("E1", "Low", "Light rain", "2025-01-01 10:00", "2025-01-01 11:00"),
+            _event("E2", "High", "Thunderstorm", "2025-01-01 09:30", "2025-01-01 10:30"),
+            _event("E3", "Medium", "Light rain", "2025-01-01 12:00", "2025-01-01 13:00"),
+        ]
+    )
+    assert merged["event_id"] == "E1+E2+E3"
+    assert merged["coalesced_events"] == ["E1", "E2", "E3"]
+    assert merged["impact_description"] == ["Light rain", "Thunderstorm"]
+    assert merged["actions"] == ["Reschedule flights", "Notify passengers"]
+    assert merged["event_type"] == ["Weather"]
+    assert merged["severity"] == ["High"]
+    assert merged["start_time"] == "2025-01-01 09:30"
+    assert merged["end_time"] == "2025-01-01 13:00"
+    assert merged["airport_code"] == ["DEL"]
+
+
+def test_merge_events_scalar_fields_and_open_window():
+    merged = merge_events(
+        [
+            {"event_id": "A", "event_type": "Weather", "severity": "low",
+             "impact_description": "fog", "start_time": "2025-01-01 10:00", "end_time": ""},
+            {"event_id": "B", "event_type": "Weather", "severity": "critical",
+             "impact_description": "fog lifting", "start_time": "2025-01-01 08:00", "end_time": ""},
+        ]
+    )
+    assert merged["event_type"] == "Weather"
+    assert merged["severity"] == "critical"
+    assert merged["impact_description"] == "fog\nfog lifting"
+    assert merged["start_time"] == "2025-01-01 08:00"
+    assert merged["end_time"] is None
+
+
+def test_coalescer_merges_by_agent_and_airport():
+    async def run():
+        queue = TaskQueue()
+        coalescer = TaskCoalescer(queue, window=0.05, agents={"weather_agent"})
+        for i, sev in enumerate(["Low", "Critical"]):
+            ev = _event(f"E{i}", sev, f"storm {i}", "2025-01-01 10:00", "2025-01-01 11:00")
+            await coalescer.put((weather_agent, ev))
+            await coalescer.put((monitoring_agent, ev))
+        other = _event("B1", "High", "storm", "2025-01-01 10:00", "2025-01-01 11:00", airport="BOM")
+        await coalescer.put((weather_agent, other))
+
+        # monitoring is not coalesced
+        assert queue.qsize() == 2
+        await asyncio.sleep(0.1)
+
+        items = []
+        while queue.qsize():
+            items.append(await queue.get())
+        weather = {p["event_id"]: p for fn, p in items if fn is weather_agent}
+        return coalescer.stats(), weather
+
+    stats, weather = asyncio.run(run())
+    assert set(weather) == {"E0+E1", "B1"}
+    assert weather["E0+E1"]["severity"] == ["Critical"]
+    assert stats["held"] == 0
+    assert stats["coalesced"] == 1
+
+
+def test_coalescer_flushes_at_max_events():
+    async def run():
+        queue = TaskQueue()
+        coalescer = TaskCoalescer(queue, window=60, agents={"weather_agent"}, max_events=3)
+        for i in range(3):
+            ev = _event(f"E{i}", "High", "storm", "2025-01-01 10:00", "2025-01-01 11:00")
+            await coalescer.put((weather_agent, ev))
+        return queue.qsize(), coalescer.stats()["held"]
+
+    assert asyncio.run(run()) == (1, 0)
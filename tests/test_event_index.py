@@ -0,0 +1,43 @@
+from event_index import EventMergeIndex
+
+
+def _event(event_id, severity, start="2025-01-01 10:00", end="2025-01-01 12:00"):
+    return {
+        "event_id": event_id,
+        "event_type": ["Weather"],
+        "severity": [severity],
+        "airport_code": ["DEL"],
+        "start_time": start,
+        "end_time": end,
+    }
+
+
+def test_overlapping_update_is_merged():
+    index = EventMergeIndex()
+    index.add(_event("E1", "High"), 1, ["weather_agent"])
+    entry = index.match(_event("E2", "Medium", "2025-01-01 11:00", "2025-01-01 13:00"))
+    assert entry is not None and entry["decision_id"] == 1
+
+
+def test_escalation_is_not_merged():
+    index = EventMergeIndex()
+    index.add(_event("E1", "Low"), 1, [])
+    assert index.match(_event("E2", "Critical")) is None
+    # once the escalation is indexed, repeats of it merge into that decision
+    index.add(_event("E2", "Critical"), 2, ["weather_agent"])
+    assert index.match(_event("E3", "Critical"))["decision_id"] == 2
+    assert index.match(_event("E4", "Low"))["decision_id"] == 1
+
+
+def test_event_without_window_never_merges():
+    index = EventMergeIndex()
+    assert index.add(_event("E1", "High", start="", end=""), 1, []) is None
+    index.add(_event("E2", "High"), 2, [])
+    assert index.match(_event("E3", "High", start="", end="")) is None
+
+
+def test_missing_end_is_not_open_ended():
+    index = EventMergeIndex()
+    index.add(_event("E1", "High", start="2025-01-01 10:00", end=""), 1, [])
+    assert index.match(_event("E2", "High", "2025-01-01 14:00", "2025-01-01 15:00")) is None
+    assert index.match(_event("E3", "High", "2025-01-01 09:00", "2025-01-01 10:30")) is not None
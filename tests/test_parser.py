@@ -0,0 +1,359 @@
+import asyncio
+import copy
+import json
+import time
+
+import pytest
+
+import parser
+from extraction_cache import ExtractionCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = ExtractionCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(parser, "extraction_cache", c)
+    return c
+
+
+def _fake_stream(text: str, finish_reason: str):
+    def stream(prompt, max_tokens=1000, status=None):
+        for i in range(0, len(text), 7):
+            yield text[i : i + 7]
+        if status is not None:
+            status["finish_reason"] = finish_reason
+
+    return stream
+
+
+EVENTS = [
+    {"event_id": "E1", "event_type": ["Weather"], "airport_code": ["DEL"]},
+    {"event_id": "E2", "event_type": ["Crew"], "airport_code": ["BOM"]},
+]
+
+
+def test_complete_chunk_is_cached(cache, monkeypatch):
+    monkeypatch.setattr(parser, "_stream_openai", _fake_stream(json.dumps(EVENTS), "stop"))
+    status = {}
+    events = list(parser._iter_llm_chunk("chunk text", status))
+    assert [e["event_id"] for e in events] == ["E1", "E2"]
+    assert not status.get("truncated")
+    assert cache.get(parser._chunk_cache_key("chunk text")) is not None
+
+
+def test_truncated_chunk_is_not_cached(cache, monkeypatch):
+    cut = json.dumps(EVENTS)[:-30]
+    monkeypatch.setattr(parser, "_stream_openai", _fake_stream(cut, "length"))
+    status = {}
+    events = list(parser._iter_llm_chunk("chunk text", status))
+    assert [e["event_id"] for e in events] == ["E1"]
+    assert status["truncated"] is True
+    assert cache.get(parser._chunk_cache_key("chunk text")) is None
+
+
+def test_truncated_batch_caches_no_chunk(cache, monkeypatch):
+    batch = [dict(EVENTS[0], chunk=1), dict(EVENTS[1], chunk=2)]
+    budgets = []
+
+    def stream(prompt, max_tokens=1000, status=None):
+        budgets.append(max_tokens)
+        yield from _fake_stream(json.dumps(batch)[:-30], "length")(prompt, max_tokens, status)
+
+    monkeypatch.setattr(parser, "_stream_openai", stream)
+    status = {}
+    out = list(parser.iter_event_batch(["chunk one", "chunk two"], status))
+    assert [(i, e["event_id"]) for i, e in out] == [(0, "E1")]
+    assert budgets == [2 * parser.CHUNK_COMPLETION_TOKENS]
+    assert status["truncated"] is True
+    assert cache.get(parser._chunk_cache_key("chunk one")) is None
+    assert cache.get(parser._chunk_cache_key("chunk two")) is None
+
+
+def test_cache_keys_carry_the_date(cache, monkeypatch):
+    text = "Event ID: WX-1\nFog at (DEL) from 10:00 onwards. Severity: Low."
+    monkeypatch.setattr(parser, "_today", lambda: "2025-01-01")
+    assert parser._resolve_chunk_locally(text)[0]["start_time"] == "2025-01-01 10:00"
+    key = parser._chunk_cache_key(text)
+    cache.set(key, parser.fast_extract_events(text))
+
+    monkeypatch.setattr(parser, "_today", lambda: "2025-01-02")
+    assert parser._chunk_cache_key(text) != key
+    assert parser._resolve_chunk_locally(text)[0]["start_time"] == "2025-01-02 10:00"
+    assert "2025-01-02" in parser._extraction_prompt()
+
+
+def test_cache_hits_are_written_back_for_eviction(tmp_path):
+    c = ExtractionCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    c.set("a", [1])
+    c.set("b", [2])
+    time.sleep(0.01)
+    assert c.get("a") == [1]  # "b" is now the least recently used
+    time.sleep(0.01)
+    c.set("c", [3])
+    assert c.get("b") is None
+    assert c.get("a") == [1] and c.get("c") == [3]
+
+
+def _collect(chunks, **kwargs):
+    async def run():
+        async def gen():
+            for c in chunks:
+                yield c
+
+        # snapshot at yield time: that is what routing sees
+        return [copy.deepcopy(ev) async for ev in parser.stream_chunk_events(gen(), **kwargs)]
+
+    return asyncio.run(run())
+
+
+def _weather(event_id, severity, desc):
+    return {
+        "event_id": event_id,
+        "event_type": ["Weather"],
+        "severity": [severity],
+        "impact_description": [desc],
+        "airport_code": ["DEL"],
+        "start_time": "2025-01-01 10:00",
+        "end_time": "2025-01-01 12:00",
+        "actions": ["Monitor"],
+    }
+
+
+def test_boundary_duplicate_dropped_and_escalation_yielded(monkeypatch):
+    resolved = {
+        "c1": [_weather("E1", "Low", "fog")],
+        "c2": [
+            _weather("E1a", "Low", "fog"),
+            _weather("E1b", "High", "dense fog"),
+            dict(_weather("E2", "Low", "x"), airport_code=["BOM"]),
+        ],
+    }
+    monkeypatch.setattr(parser, "_resolve_chunk_locally", lambda c: resolved[c])
+    events = _collect(["c1", "c2"])
+    # the equal-severity repeat is dropped; the escalation is routed again
+    assert [e["event_id"] for e in events] == ["E1", "E1", "E2"]
+    assert events[0]["severity"] == ["Low"]
+    assert events[1]["severity"] == ["High"]
+    assert events[1]["impact_description"] == ["fog", "dense fog"]
+    # the resolved (cacheable) events are left untouched
+    assert resolved["c1"][0]["severity"] == ["Low"]
+
+
+def test_dedup_only_between_adjacent_chunks_and_with_a_start(monkeypatch):
+    def traffic(event_id, desc, start=""):
+        return {
+            "event_id": event_id,
+            "event_type": ["Traffic"],
+            "severity": ["Medium"],
+            "impact_description": [desc],
+            "airport_code": ["DEL"],
+            "start_time": start,
+            "end_time": "",
+        }
+
+    resolved = {
+        "c1": [traffic("T1", "Runway 09 closed"), _weather("W1", "Low", "fog")],
+        "c2": [traffic("T2", "Taxiway B congestion")],
+        "c3": [],
+        "c4": [_weather("W2", "Low", "fog again")],
+    }
+    monkeypatch.setattr(parser, "_resolve_chunk_locally", lambda c: resolved[c])
+    events = _collect(["c1", "c2", "c3", "c4"])
+    assert [e["event_id"] for e in events] == ["T1", "W1", "T2", "W2"]
+
+
+def test_events_yielded_while_the_model_streams(monkeypatch):
+    events = [dict(_weather(f"E{i}", "Low", "fog"), airport_code=[f"A{i:02d}"]) for i in range(3)]
+
+    def slow(chunk, status=None):
+        for ev in events:
+            time.sleep(0.2)
+            yield ev
+
+    monkeypatch.setattr(parser, "_resolve_chunk_locally", lambda c: None)
+    monkeypatch.setattr(parser, "_iter_llm_chunk", slow)
+
+    async def run():
+        async def gen():
+            yield "only chunk"
+
+        t0 = time.perf_counter()
+        return [time.perf_counter() - t0 async for _ in parser.stream_chunk_events(gen())]
+
+    times = asyncio.run(run())
+    assert len(times) == 3
+    assert times[0] < 0.4 < times[-1]
+
+
+# --------------- fast path ---------------
+def test_fast_path_well_formed_bulletin():
+    text = (
+        "Event ID: WX-101\n"
+        "Dense fog at Delhi (DEL) between 2025-01-05 05:00 - 2025-01-05 09:00. Severity: High.\n"
+        "Actions: Hold departures; Notify passengers"
+    )
+    [ev] = parser.fast_extract_events(text)
+    assert ev["event_id"] == "WX-101"
+    assert ev["event_type"] == ["Weather"]
+    assert ev["severity"] == ["High"]
+    assert ev["airport_code"] == ["DEL"]
+    assert (ev["start_time"], ev["end_time"]) == ("2025-01-05 05:00", "2025-01-05 09:00")
+    assert ev["actions"] == ["Hold departures", "Notify passengers"]
+
+
+def test_fast_path_overnight_window():
+    # without dates the end would sort before the start: left to the LLM
+    undated = "Event ID: WX-102\nThunderstorm at (BOM) between 23:00 - 02:00. Severity: Medium."
+    assert parser.fast_extract_events(undated) is None
+    dated = (
+        "Event ID: WX-103\n"
+        "Thunderstorm at (BOM) between 2025-01-05 23:00 - 2025-01-06 02:00. Severity: Medium."
+    )
+    [ev] = parser.fast_extract_events(dated)
+    assert (ev["start_time"], ev["end_time"]) == ("2025-01-05 23:00", "2025-01-06 02:00")
+
+
+def test_fast_path_open_windows_use_today():
+    onwards = parser.fast_extract_events("Event ID: WX-1\nFog at (DEL) from 10:00 onwards. Severity: Low.")
+    assert (onwards[0]["start_time"], onwards[0]["end_time"]) == (f"{parser._today()} 10:00", "")
+    until = parser.fast_extract_events("Event ID: T-1\nRunway closure at (HYD) until 14:30. Severity: Medium.")
+    assert until[0]["event_type"] == ["Traffic"]
+    assert (until[0]["start_time"], until[0]["end_time"]) == ("", f"{parser._today()} 14:30")
+
+
+def test_fast_path_window_is_not_wind():
+    text = "Event ID: CR-1\nCrew duty time exceeded at (BLR) within the window from 10:00 to 12:00. Severity: Low."
+    [ev] = parser.fast_extract_events(text)
+    assert ev["event_type"] == ["Crew"]
+
+
+def test_fast_path_skips_boilerplate_but_not_ambiguous_blocks():
+    text = "Operations bulletin issued by OCC.\n\nEvent ID: WX-1\nFog at (DEL) from 10:00 onwards. Severity: Low."
+    assert [e["event_id"] for e in parser.fast_extract_events(text)] == ["WX-1"]
+    # two types, or no severity: the whole chunk goes to the LLM
+    assert parser.fast_extract_events(text + "\n\nFog and bomb threat at (DEL) between 10:00 - 11:00. Severity: High.") is None
+    assert parser.fast_extract_events("Fog at (DEL) between 10:00 - 11:00.") is None
+    assert parser.fast_extract_events("Operations bulletin issued by OCC.") is None
+
+
+# --------------- chunking ---------------
+@pytest.fixture
+def estimated_tokens(monkeypatch):
+    # the offline estimate (4 chars per token) keeps chunk sizes deterministic
+    monkeypatch.setattr(parser, "_encoding", False)
+
+
+def _paragraphs(n):
+    return [f"P{i} " + "x" * (20 + i * 3) for i in range(n)]
+
+
+def _chunk(pages, max_tokens, overlap_tokens):
+    return list(parser.iter_text_chunks(pages, max_tokens=max_tokens, overlap_tokens=overlap_tokens))
+
+
+def _first_seen(chunks):
+    order = []
+    for chunk in chunks:
+        for p in chunk.split("\n\n"):
+            if p.startswith("P") and p not in order:
+                order.append(p)
+    return order
+
+
+def test_chunker_budget_and_overlap(estimated_tokens):
+    paras = _paragraphs(8)
+    pages = ["\n\n".join(paras[:4]) + "\n", "\n\n".join(paras[4:])]
+    plain = _chunk(pages, 30, 0)
+    assert all(parser.count_tokens(c) <= 30 for c in plain)
+    assert _first_seen(plain) == paras
+    assert not set(plain[0].split("\n\n")) & set(plain[1].split("\n\n"))
+
+    overlapped = _chunk(pages, 30, 10)
+    assert all(parser.count_tokens(c) <= 30 for c in overlapped)
+    assert _first_seen(overlapped) == paras
+    for prev, cur in zip(overlapped, overlapped[1:]):
+        assert cur.split("\n\n")[0] in prev
+
+
+def test_chunker_overlap_larger_than_budget(estimated_tokens):
+    paras = _paragraphs(8)
+    chunks = _chunk(["\n\n".join(paras)], 30, 100)
+    # the overlap is capped by what still fits next to the new paragraph
+    assert all(parser.count_tokens(c) <= 30 for c in chunks)
+    assert _first_seen(chunks) == paras
+    assert len(chunks) <= len(paras)
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert cur.split("\n\n")[-1] not in prev
+
+
+def test_chunker_oversized_paragraph(estimated_tokens):
+    big = "y" * 400
+    pages = ["P0 short\n\n" + big + "\n\nP2 tail"]
+    chunks = _chunk(pages, 30, 0)
+    assert all(parser.count_tokens(c) <= 30 for c in chunks)
+    # windows are cut without overlap, so the paragraph reassembles exactly
+    assert chunks[0] == "P0 short"
+    assert "".join(chunks[1:]) == big + "\n\nP2 tail"
+
+    # overlap of the hard-split windows is a token tail of the previous window
+    overlapped = _chunk(pages, 30, 100)
+    assert all(parser.count_tokens(c) <= 30 for c in overlapped)
+    assert overlapped[-1].endswith("y\n\nP2 tail")
+
+
+def test_chunker_joins_paragraph_across_pages(estimated_tokens):
+    assert _chunk(["A first half", "second half\n\nB"], 100, 0) == ["A first half\nsecond half\n\nB"]
+    assert _chunk(["", "\n\n", "only"], 100, 0) == ["only"]
+
+
+# --------------- stream decoding ---------------
+_TRICKY = [
+    {"event_id": "A", "impact_description": 'gusts {40kt} [peak] "severe" \\ end'},
+    {"event_id": "B", "actions": ["hold}", "divert]"]},
+]
+
+
+def test_decoder_strings_with_braces_fed_char_by_char():
+    raw = "```json\n" + json.dumps(_TRICKY) + "\n```"
+    decoder = parser.EventStreamDecoder()
+    out = []
+    for ch in raw:
+        out.extend(decoder.feed(ch))
+    assert out == _TRICKY
+
+
+def test_decoder_truncated_tail_keeps_closed_events():
+    raw = json.dumps(_TRICKY)
+    assert parser.EventStreamDecoder().feed(raw[:-20]) == _TRICKY[:1]
+    # cut inside a string holding a brace
+    cut = raw.index("hold}") + len("hold}")
+    assert parser.EventStreamDecoder().feed(raw[:cut]) == _TRICKY[:1]
+
+
+def test_decoder_bare_object_and_malformed_entries():
+    assert parser.EventStreamDecoder().feed('{"event_id": "X", "n": {"a": 1}}') == [
+        {"event_id": "X", "n": {"a": 1}}
+    ]
+    # an object that does not parse is skipped, the next one still decodes
+    assert parser.EventStreamDecoder().feed('[{"event_id": "X",}, {"event_id": "Y"}]') == [
+        {"event_id": "Y"}
+    ]
+
+
+def test_decoder_ignores_text_after_the_array():
+    decoder = parser.EventStreamDecoder()
+    assert decoder.feed('Events: [{"event_id": "A"}]') == [{"event_id": "A"}]
+    assert decoder.feed(' e.g. [{"event_id": "example"}]') == []
+
+
+def test_fast_path_unrecognised_block_goes_to_the_llm():
+    fog = "Event ID: WX-1\nFog at (DEL) from 10:00 onwards. Severity: Low."
+    outage = "All departures from Mumbai suspended until further notice due to a power outage."
+    strike = "Ground handling strike; flights cancelled."
+    assert parser.fast_extract_events(f"{fog}\n\n{outage}") is None
+    assert parser.fast_extract_events(f"{fog}\n\n{strike}") is None
+    footer = "Refer to the operations manual section 4 for contact numbers.\nLounge access remains unchanged."
+    assert [e["event_id"] for e in parser.fast_extract_events(f"{fog}\n\n{footer}")] == ["WX-1"]
+    # sentences cut at a chunk edge
+    assert [e["event_id"] for e in parser.fast_extract_events(f"the seasonal plan.\n\n{fog}\n\nGate allocation fol")] == ["WX-1"]
+    assert parser.fast_extract_events(f"{fog}\n\nAll departures from Mumbai suspend") is None
@@ -0,0 +1,284 @@
+import asyncio
+
+import pytest
+
+import task_queue
+from task_queue import TASK_PRIORITY_LEVELS, TaskQueue, WorkerPool, task_priority
+
+
+def _event(event_id, severity="High"):
+    return {"event_id": event_id, "severity": [severity]}
+
+
+class FlakyAckQueue(TaskQueue):
+    # stands in for PostgresTaskQueue when complete_agent_tasks fails
+    async def task_done(self, item) -> None:
+        await super().task_done(item)
+        if item[1]["event_id"] == "E1":
+            raise ConnectionError("connection reset")
+
+
+def test_worker_survives_failed_acknowledgement():
+    done = []
+
+    async def weather_agent(event):
+        done.append(event["event_id"])
+
+    async def run():
+        pool = WorkerPool(FlakyAckQueue(limits={}), size=1)
+        await pool.start()
+        await pool.queue.put((weather_agent, _event("E1")))
+        await pool.queue.put((weather_agent, _event("E2")))
+        await asyncio.sleep(0.05)
+        alive = not pool._tasks[0].done()
+        await pool.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert done == ["E1", "E2"]
+
+
+async def crew_agent(event):
+    return event
+
+
+async def weather_agent(event):
+    return event
+
+
+async def _get_now(queue):
+    # get() without blocking the test when nothing is eligible
+    try:
+        return await asyncio.wait_for(queue.get(), 0.05)
+    except asyncio.TimeoutError:
+        return None
+
+
+# --------------- per-agent caps ---------------
+def test_capped_agent_does_not_hold_up_others():
+    async def run():
+        queue = TaskQueue(limits={"crew_agent": 1}, offsets={})
+        await queue.put((crew_agent, _event("C1")))
+        await queue.put((crew_agent, _event("C2")))
+        await queue.put((weather_agent, _event("W1", "Low")))
+
+        first = await _get_now(queue)
+        second = await _get_now(queue)
+        blocked = await _get_now(queue)
+        stats = queue.stats()
+        await queue.task_done(first)
+        third = await _get_now(queue)
+        return first, second, blocked, stats, third
+
+    first, second, blocked, stats, third = asyncio.run(run())
+    assert first[1]["event_id"] == "C1"
+    # crew is at its cap, so the lower-severity weather task goes next
+    assert second[1]["event_id"] == "W1"
+    assert blocked is None
+    assert stats["crew_agent"] == {"queued": 1, "running": 1, "limit": 1}
+    assert third[1]["event_id"] == "C2"
+
+
+def test_worker_pool_respects_agent_cap():
+    running, peak = 0, 0
+
+    async def crew_agent(event):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    async def run():
+        pool = WorkerPool(TaskQueue(limits={"crew_agent": 2}, offsets={}), size=6)
+        await pool.start()
+        for i in range(8):
+            await pool.queue.put((crew_agent, _event(f"C{i}")))
+        await asyncio.sleep(0.2)
+        stats = pool.stats()
+        await pool.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert peak == 2
+    assert sum(w["tasks"] for w in stats["workers"]) == 8
+
+
+# --------------- priority and aging ---------------
+async def bomb_threat_agent(event):
+    return event
+
+
+async def monitoring_agent(event):
+    return event
+
+
+def test_task_priority_from_severity_and_agent_offset():
+    offsets = {"bomb_threat_agent": -1, "monitoring_agent": 2}
+    assert task_priority("weather_agent", _event("E", "Critical"), offsets) == 0
+    assert task_priority("weather_agent", _event("E", "Low"), offsets) == 3
+    # unknown severity counts as medium; the result is clamped to the levels
+    assert task_priority("weather_agent", {"severity": "odd"}, offsets) == 2
+    assert task_priority("bomb_threat_agent", _event("E", "Critical"), offsets) == 0
+    assert task_priority("monitoring_agent", _event("E", "Low"), offsets) == TASK_PRIORITY_LEVELS - 1
+
+
+def test_most_urgent_task_first():
+    async def run():
+        queue = TaskQueue(limits={}, offsets={"bomb_threat_agent": -1, "monitoring_agent": 2})
+        await queue.put((monitoring_agent, _event("M1", "High")))
+        await queue.put((weather_agent, _event("W1", "Low")))
+        await queue.put((weather_agent, _event("W2", "Critical")))
+        await queue.put((bomb_threat_agent, _event("B1", "High")))
+        order = [(await queue.get())[1]["event_id"] for _ in range(4)]
+        return order, queue.priority_stats()
+
+    order, stats = asyncio.run(run())
+    # W2: 0, B1: 1 - 1 = 0 but queued later, M1: 1 + 2 = 3 ahead of W1 (3) by age
+    assert order == ["W2", "B1", "M1", "W1"]
+    assert stats[0]["dequeued"] == 2 and stats[3]["dequeued"] == 2
+
+
+def test_aging_lets_old_low_priority_work_through():
+    async def run():
+        queue = TaskQueue(limits={}, offsets={}, aging=0.01)
+        await queue.put((weather_agent, _event("OLD", "Low")))
+        await asyncio.sleep(0.05)  # five levels' worth of waiting
+        await queue.put((weather_agent, _event("NEW", "Critical")))
+        return [(await queue.get())[1]["event_id"] for _ in range(2)]
+
+    assert asyncio.run(run()) == ["OLD", "NEW"]
+
+    # without aging credit the critical task wins
+    async def fresh():
+        queue = TaskQueue(limits={}, offsets={}, aging=60)
+        await queue.put((weather_agent, _event("OLD", "Low")))
+        await queue.put((weather_agent, _event("NEW", "Critical")))
+        return (await queue.get())[1]["event_id"]
+
+    assert asyncio.run(fresh()) == "NEW"
+
+
+# --------------- admission control ---------------
+@pytest.fixture
+def sheddable(monkeypatch):
+    monkeypatch.setattr(task_queue, "TASK_SHEDDABLE_AGENTS", {"monitoring_agent"})
+    monkeypatch.setattr(task_queue, "TASK_QUEUE_SATURATION", 0.8)
+
+
+def test_put_waits_for_room_at_max_depth(sheddable):
+    async def run():
+        queue = TaskQueue(limits={}, offsets={}, max_depth=2, high_water={})
+        await queue.put((weather_agent, _event("W1")))
+        await queue.put((weather_agent, _event("W2")))
+        saturated = queue.saturated()
+        blocked = asyncio.create_task(queue.put((weather_agent, _event("W3"))))
+        await asyncio.sleep(0.02)
+        waited = not blocked.done()
+        await queue.get()
+        accepted = await asyncio.wait_for(blocked, 1)
+        return saturated, waited, accepted, queue.qsize()
+
+    assert asyncio.run(run()) == (True, True, True, 2)
+
+
+@pytest.mark.parametrize("policy", ["shed", "downgrade"])
+def test_sheddable_agent_past_high_water(sheddable, monkeypatch, policy):
+    monkeypatch.setattr(task_queue, "TASK_SHED_POLICY", policy)
+
+    async def run():
+        queue = TaskQueue(limits={}, offsets={}, max_depth=10, high_water={"monitoring_agent": 2})
+        accepted = [await queue.put((monitoring_agent, _event(f"M{i}", "Critical"))) for i in range(3)]
+        # other agents are never shed
+        accepted.append(await queue.put((weather_agent, _event("W1", "Low"))))
+        return accepted, queue.admission_stats(), queue.priority_stats()
+
+    accepted, admission, levels = asyncio.run(run())
+    if policy == "shed":
+        assert accepted == [True, True, False, True]
+        assert admission["shed"] == {"monitoring_agent": 1}
+        assert levels[TASK_PRIORITY_LEVELS - 1]["depth"] == 0
+    else:
+        assert accepted == [True, True, True, True]
+        assert admission["downgraded"] == {"monitoring_agent": 1}
+        assert levels[TASK_PRIORITY_LEVELS - 1]["depth"] == 1
+
+
+def test_full_queue_sheds_even_when_downgrading(sheddable, monkeypatch):
+    monkeypatch.setattr(task_queue, "TASK_SHED_POLICY", "downgrade")
+
+    async def run():
+        queue = TaskQueue(limits={}, offsets={}, max_depth=1, high_water={})
+        await queue.put((weather_agent, _event("W1")))
+        # would otherwise wait for room behind the weather task
+        return await asyncio.wait_for(queue.put((monitoring_agent, _event("M1"))), 1), queue.shed
+
+    assert asyncio.run(run()) == (False, {"monitoring_agent": 1})
+
+
+# --------------- timeouts, retries and dead letters ---------------
+@pytest.fixture
+def dead_letters(monkeypatch):
+    letters = []
+
+    async def insert_dead_letter(agent, payload, error, attempts):
+        letters.append((agent, payload["event_id"], error.split(":")[0], attempts))
+        return len(letters)
+
+    monkeypatch.setattr(task_queue, "insert_dead_letter", insert_dead_letter)
+    monkeypatch.setattr(task_queue, "retry_delay", lambda attempt: 0)
+    monkeypatch.setattr(task_queue, "TASK_MAX_ATTEMPTS", 3)
+    return letters
+
+
+def _run_pool(agent, timeouts=None):
+    async def run():
+        pool = WorkerPool(TaskQueue(limits={}, offsets={}), size=1)
+        pool.timeouts = timeouts or {}
+        await pool.start()
+        await pool.queue.put((agent, _event("E1")))
+        await asyncio.sleep(0.2)
+        stats = pool.stats()
+        await pool.stop()
+        return stats
+
+    return asyncio.run(run())
+
+
+def test_transient_failure_is_retried(dead_letters):
+    calls = []
+
+    async def flaky_agent(event):
+        calls.append(event["event_id"])
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    stats = _run_pool(flaky_agent)
+    assert len(calls) == 3
+    assert stats["retries"] == 2
+    assert dead_letters == []
+
+
+def test_timeout_retried_then_dead_lettered(dead_letters):
+    async def slow_agent(event):
+        await asyncio.sleep(1)
+
+    stats = _run_pool(slow_agent, timeouts={"slow_agent": 0.02})
+    assert stats["timed_out"] == 3
+    assert stats["dead_lettered"] == 1
+    assert dead_letters == [("slow_agent", "E1", "TimeoutError", 3)]
+
+
+def test_permanent_failure_dead_lettered_at_once(dead_letters):
+    calls = []
+
+    async def broken_agent(event):
+        calls.append(event["event_id"])
+        raise ValueError("bad payload")
+
+    stats = _run_pool(broken_agent)
+    assert calls == ["E1"]
+    assert stats["retries"] == 0
+    assert stats["workers"][0]["errors"] == 1
+    assert dead_letters == [("broken_agent", "E1", "ValueError", 1)]
@@ -1,3 +1,4 @@
+import asyncio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -8,27 +9,33 @@ load_dotenv()  # load .env values
 
 SMTP_EMAIL = os.getenv("SMTP_EMAIL")  # your Gmail address
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")  # 16-digit App Password
+# seconds before a connect or any SMTP command gives up
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 20))
 
 
 def send_email(to, subject, message):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_EMAIL
-        msg["To"] = to
-        msg["Subject"] = subject
-
-        msg.attach(MIMEText(message, "plain"))
-
-        # Gmail SMTP settings
-        server = smtplib.SMTP("smtp.gmail.com", 587)
+    """
+    Blocking send. SMTP errors (OSError subclasses, including timeouts)
+    propagate so the task worker can retry or dead-letter the agent run.
+    """
+    msg = MIMEMultipart()
+    msg["From"] = SMTP_EMAIL
+    msg["To"] = to
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(message, "plain"))
+
+    # Gmail SMTP settings
+    with smtplib.SMTP("smtp.gmail.com", 587, timeout=SMTP_TIMEOUT) as server:
         server.starttls()
         server.login(SMTP_EMAIL, SMTP_PASSWORD)
-
         server.sendmail(SMTP_EMAIL, to, msg.as_string())
-        server.quit()
 
-        return True
+    return True
+
 
-    except Exception as e:
-        print("Email error:", e)
-        return False
+async def send_email_async(to, subject, message):
+    """
+    send_email in a thread, so a slow SMTP server never blocks the event loop.
+    """
+    return await asyncio.to_thread(send_email, to, subject, message)
@@ -1,5 +1,7 @@
 # api_client.py
 
+import time
+
 import streamlit as st
 import requests
 
@@ -44,8 +46,8 @@ def post_threat_simulation(city: str, alternate_airport: str | None) -> dict | s
         return {"error": f"Connection or unexpected error: {e}"}
     
 
-def post_upload_pdf(file):
-    """Uploads PDF and triggers threat processing in Flask API."""
+def post_upload_pdf(file, poll_interval: float = 2.0, max_wait: float = 900):
+    """Submits the PDF as a background job and polls until it finishes."""
     try:
         BASE_URL_ = "http://localhost:8000"
         files = {
@@ -53,13 +55,25 @@ def post_upload_pdf(file):
         }
 
         response = requests.post(
-            f"{BASE_URL_}/upload",
+            f"{BASE_URL_}/jobs",
             files=files,
             timeout=30
         )
-
         response.raise_for_status()
-        return response.json()
+        job_id = response.json()["job_id"]
+
+        deadline = time.time() + max_wait
+        while time.time() < deadline:
+            response = requests.get(f"{BASE_URL_}/jobs/{job_id}", timeout=10)
+            response.raise_for_status()
+            job = response.json()
+            if job["stage"] == "completed":
+                return {"status": "success", **job}
+            if job["stage"] == "failed":
+                return {"error": job.get("error") or "Job failed", **job}
+            time.sleep(poll_interval)
+
+        return {"error": f"Job {job_id} still running after {max_wait}s"}
 
     except requests.exceptions.HTTPError:
         try:
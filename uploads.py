@@ -0,0 +1,157 @@
+# uploads.py
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", 200 * 1024 * 1024))
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 100 * 1024 * 1024))
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", 20))
+# where uploads are spooled; defaults to the system temp dir
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+
+class SpooledPDF:
+    """
+    One uploaded PDF written to a temp file on disk. The parser memory-maps
+    `path`, so the upload never has to be held in memory.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self._file = tempfile.NamedTemporaryFile(
+            prefix="upload_", suffix=".pdf", dir=UPLOAD_SPOOL_DIR, delete=False
+        )
+        self.path = self._file.name
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _MultipartSpooler:
+    """
+    Streaming multipart/form-data reader: every file part is written to its
+    own SpooledPDF as the request body arrives. Non-file fields are ignored.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.files = []
+        self._current = None
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._pending = []  # (SpooledPDF, bytes) waiting to be written
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+            },
+        )
+
+    def _on_part_begin(self):
+        self._current = None
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename is None:
+            return
+        filename = os.path.basename(filename.decode("utf-8", "replace"))
+        if not filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"{filename}: only PDF files are accepted")
+        if len(self.files) >= UPLOAD_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"At most {UPLOAD_MAX_FILES} files per request")
+        self._current = SpooledPDF(filename)
+        self.files.append(self._current)
+
+    def _on_part_data(self, data, start, end):
+        if self._current is None:
+            return
+        self._current.size += end - start
+        if self._current.size > UPLOAD_MAX_FILE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{self._current.filename} exceeds {UPLOAD_MAX_FILE_BYTES} bytes",
+            )
+        self._pending.append((self._current, data[start:end]))
+
+    def _on_part_end(self):
+        self._current = None
+
+    def _write_pending(self):
+        for spooled, data in self._pending:
+            spooled._file.write(data)
+        self._pending = []
+
+    async def feed(self, chunk: bytes):
+        self._parser.write(chunk)
+        if self._pending:
+            await asyncio.to_thread(self._write_pending)
+
+    def finish(self):
+        self._parser.finalize()
+        for spooled in self.files:
+            spooled.close()
+
+
+@asynccontextmanager
+async def spooled_pdfs(request: Request):
+    """
+    Stream the PDF parts of a multipart request to temp files and yield the
+    list of SpooledPDF; the files are deleted on exit. Enforces
+    UPLOAD_MAX_REQUEST_BYTES, UPLOAD_MAX_FILE_BYTES and UPLOAD_MAX_FILES (413).
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail=f"Request exceeds {UPLOAD_MAX_REQUEST_BYTES} bytes")
+
+    spooler = _MultipartSpooler(options[b"boundary"])
+    try:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > UPLOAD_MAX_REQUEST_BYTES:
+                raise HTTPException(
+                    status_code=413, detail=f"Request exceeds {UPLOAD_MAX_REQUEST_BYTES} bytes"
+                )
+            await spooler.feed(chunk)
+        spooler.finish()
+        if not spooler.files:
+            raise HTTPException(status_code=400, detail="No PDF files in request")
+        yield spooler.files
+    finally:
+        for spooled in spooler.files:
+            spooled.discard()
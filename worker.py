@@ -0,0 +1,45 @@
+# worker.py
+"""
+Standalone agent worker for the durable task queue. Run any number of these
+(on any number of nodes) next to app.py started with TASK_QUEUE_BACKEND=postgres:
+
+    python worker.py --workers 8
+"""
+import argparse
+import asyncio
+import signal
+
+from dotenv import load_dotenv
+
+from database import init_db
+from decision_worker import AGENT_MAP
+from task_queue import PostgresTaskQueue, WorkerPool, TASK_WORKERS, register_agents
+
+load_dotenv()
+
+
+async def run(workers: int):
+    await init_db()
+    register_agents(AGENT_MAP)
+    pool = WorkerPool(PostgresTaskQueue(prefetch=workers), size=workers)
+    await pool.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    # unfinished tasks are picked up again once their visibility timeout passes
+    await pool.stop()
+    print("[worker] stopped")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Run agent tasks from the Postgres task queue")
+    ap.add_argument("--workers", type=int, default=TASK_WORKERS)
+    args = ap.parse_args(argv)
+    asyncio.run(run(args.workers))
+
+
+if __name__ == "__main__":
+    main()